@@ -0,0 +1,168 @@
+import fcntl
+import gzip
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+
+from storage import db
+from core.config import (
+    ACTIVITY_RETENTION_DAYS, ACTIVITY_ARCHIVE_DIR,
+    ACTIVITY_ARCHIVE_INTERVAL, ACTIVITY_ARCHIVE_BATCH
+)
+
+MANIFEST_PATH = os.path.join(ACTIVITY_ARCHIVE_DIR, "manifest.json")
+LOCK_PATH = os.path.join(ACTIVITY_ARCHIVE_DIR, ".lock")
+
+logger = logging.getLogger(__name__)
+
+
+# =========================================================
+# ACTIVITY LOG RETENTION
+# =========================================================
+# Entries older than ACTIVITY_RETENTION_DAYS are moved out of the hot
+# store into gzip'd JSON-lines segments, ACTIVITY_ARCHIVE_BATCH entries
+# each. manifest.json lists every segment with its id range and the tasks
+# it holds, so reading a task's older history only opens the segments
+# that have some; a task id -> segments map is built whenever the
+# manifest is (re)loaded, so finding them doesn't scan the manifest.
+#
+# A segment is written and fsynced, and listed in the manifest, before
+# its entries are deleted: a crash in between leaves entries in both
+# places, never in neither. Readers drop the duplicates by id. Only one
+# process archives at a time (flock on archive/.lock).
+
+_manifest_lock = threading.Lock()
+_manifest: dict = {"mtime": None, "segments": [], "by_task": {}}
+
+
+def _load_manifest() -> list[dict]:
+    with _manifest_lock:
+        try:
+            mtime = os.path.getmtime(MANIFEST_PATH)
+        except OSError:
+            return []
+
+        # Another worker may have archived since we last looked
+        if mtime != _manifest["mtime"]:
+            with open(MANIFEST_PATH) as file:
+                segments = json.load(file)
+
+            # task id -> its segments, newest first
+            by_task: dict[int, list[dict]] = {}
+            for segment in sorted(segments, key=lambda s: s["last_id"], reverse=True):
+                for task_id in segment["task_ids"]:
+                    by_task.setdefault(task_id, []).append(segment)
+
+            _manifest.update(mtime=mtime, segments=segments, by_task=by_task)
+
+        return _manifest["segments"]
+
+
+def _task_segments(task_id: int) -> list[dict]:
+    _load_manifest()
+    with _manifest_lock:
+        return _manifest["by_task"].get(task_id, [])
+
+
+def _write_atomic(path: str, write):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as file:
+        write(file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+
+def _write_segment(entries: list[dict]) -> dict:
+    first, last = entries[0]["id"], entries[-1]["id"]
+    name = f"activity-{first}-{last}.jsonl.gz"
+
+    def write(file):
+        with gzip.GzipFile(fileobj=file, mode="wb") as gz:
+            for entry in entries:
+                gz.write((json.dumps(entry) + "\n").encode())
+
+    _write_atomic(os.path.join(ACTIVITY_ARCHIVE_DIR, name), write)
+
+    return {
+        "file": name,
+        "first_id": first,
+        "last_id": last,
+        "task_ids": sorted({e["task_id"] for e in entries if e.get("task_id") is not None})
+    }
+
+
+def archive_old(now: datetime | None = None) -> int:
+    if ACTIVITY_RETENTION_DAYS <= 0:
+        return 0
+
+    cutoff = (now or datetime.utcnow()) - timedelta(days=ACTIVITY_RETENTION_DAYS)
+    os.makedirs(ACTIVITY_ARCHIVE_DIR, exist_ok=True)
+
+    with open(LOCK_PATH, "w") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return 0  # another worker is on it
+
+        archived = 0
+        while True:
+            batch = db.range(
+                "activity_logs", "timestamp", None, cutoff.isoformat(),
+                limit=ACTIVITY_ARCHIVE_BATCH
+            )
+            batch.sort(key=lambda e: e["id"])
+            if not batch:
+                return archived
+
+            segments = [*_load_manifest(), _write_segment(batch)]
+            _write_atomic(MANIFEST_PATH, lambda f: f.write(json.dumps(segments).encode()))
+
+            with db.transaction():
+                for entry in batch:
+                    db.delete("activity_logs", entry["id"])
+            archived += len(batch)
+
+
+def archived_page(task_id: int, before: int | None = None, limit: int = 50) -> list[dict]:
+    # The `limit` newest archived entries for a task below `before`,
+    # oldest first, reading the newest segments first
+    found: dict[int, dict] = {}
+
+    for segment in _task_segments(task_id):
+        if before is not None and segment["first_id"] >= before:
+            continue
+        if len(found) >= limit and segment["last_id"] < min(found):
+            break
+
+        with gzip.open(os.path.join(ACTIVITY_ARCHIVE_DIR, segment["file"]), "rt") as file:
+            for line in file:
+                entry = json.loads(line)
+                if entry.get("task_id") == task_id and (before is None or entry["id"] < before):
+                    found[entry["id"]] = entry
+
+    return [found[i] for i in sorted(found)[-limit:]]
+
+
+# ---------------- BACKGROUND JOB ----------------
+
+_stop = threading.Event()
+
+def start():
+    def run():
+        while True:
+            try:
+                archive_old()
+            except Exception:
+                # Try again next interval rather than end the thread
+                logger.exception("activity archiving failed")
+            if _stop.wait(ACTIVITY_ARCHIVE_INTERVAL):
+                return
+
+    _stop.clear()
+    threading.Thread(target=run, name="activity-archive", daemon=True).start()
+
+def stop():
+    _stop.set()
@@ -1,10 +1,30 @@
-from fastapi import APIRouter, Depends
-from json_db import load_db
+import asyncio
+from fastapi import APIRouter, Depends, Query
+from storage import db
 from role_utils import get_payload
+from activity_archive import archived_page
 
 router = APIRouter(prefix="/activity")
 
+# Newest page first, oldest to newest within it; next_before pages back
 @router.get("/{task_id}")
-def get_task_activity(task_id: int, payload: dict = Depends(get_payload)):
-    db = load_db()
-    return [log for log in db["activity_logs"] if log["task_id"] == task_id]
+async def get_task_activity(
+    task_id: int,
+    before: int | None = Query(None, description="Return entries older than this id"),
+    limit: int = Query(50, ge=1, le=200),
+    payload: dict = Depends(get_payload)
+):
+    logs = await db.aread(
+        db.page, "activity_logs", "task_id", task_id, before=before, limit=limit
+    )
+
+    # Past the hot store: the rest comes from archived segments
+    if len(logs) < limit:
+        cursor = logs[0]["id"] if logs else before
+        older = await asyncio.to_thread(archived_page, task_id, cursor, limit - len(logs))
+        logs = older + logs
+
+    return {
+        "logs": logs,
+        "next_before": logs[0]["id"] if len(logs) == limit else None
+    }
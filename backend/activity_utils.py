@@ -1,11 +1,10 @@
 from datetime import datetime
+from storage import db
 
-def log_activity(db, task_id, user_id, action):
-    log = {
-        "id": len(db["activity_logs"]) + 1,
+def log_activity(task_id, user_id, action):
+    return db.insert("activity_logs", {
         "task_id": task_id,
         "user_id": user_id,
         "message": action,
         "timestamp": datetime.utcnow().isoformat()
-    }
-    db["activity_logs"].append(log)
+    })
@@ -1,11 +1,22 @@
+import asyncio
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 from jose import jwt, JWTError
 from passlib.context import CryptContext
-from core.config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_HOURS
+from core.config import (
+    SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_HOURS,
+    TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL,
+    BCRYPT_ROUNDS, PASSWORD_POOL_SIZE, PASSWORD_QUEUE_DEPTH
+)
 
 pwd_context = CryptContext(
     schemes=["bcrypt"],
-    deprecated="auto"
+    deprecated="auto",
+    bcrypt__rounds=BCRYPT_ROUNDS
 )
 
 # ---------------- PASSWORD ----------------
@@ -16,6 +27,49 @@ def hash_password(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
+# bcrypt is deliberately slow, so request handlers run it in a small
+# process pool instead of the shared threadpool. Once more than
+# PASSWORD_QUEUE_DEPTH jobs are waiting, callers get PasswordPoolBusy
+# straight away rather than queueing behind a login storm.
+
+class PasswordPoolBusy(Exception):
+    pass
+
+_password_pool: ProcessPoolExecutor | None = None
+_password_jobs = 0
+
+async def _run_password_job(fn, *args):
+    global _password_pool, _password_jobs
+
+    if _password_jobs >= PASSWORD_POOL_SIZE + PASSWORD_QUEUE_DEPTH:
+        raise PasswordPoolBusy()
+
+    if _password_pool is None:
+        # "spawn" so workers don't inherit the server's threads and locks
+        _password_pool = ProcessPoolExecutor(
+            max_workers=PASSWORD_POOL_SIZE,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+
+    _password_jobs += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_password_pool, fn, *args)
+    finally:
+        _password_jobs -= 1
+
+async def hash_password_async(password: str) -> str:
+    return await _run_password_job(hash_password, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_password_job(verify_password, plain_password, hashed_password)
+
+def shutdown_password_pool():
+    global _password_pool
+    if _password_pool is not None:
+        _password_pool.shutdown(cancel_futures=True)
+        _password_pool = None
+
 # ---------------- JWT ----------------
 
 def create_access_token(data: dict) -> str:
@@ -29,12 +83,40 @@ def create_access_token(data: dict) -> str:
         algorithm=ALGORITHM
     )
 
+# Verified tokens are cached (LRU, bounded) so the same token polled all
+# day is only verified once per TOKEN_CACHE_TTL. An entry never outlives
+# the token's own "exp".
+_token_cache: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+_token_cache_lock = threading.Lock()
+
 def decode_token(token: str) -> dict | None:
+    now = time.time()
+
+    with _token_cache_lock:
+        cached = _token_cache.get(token)
+        if cached:
+            expires_at, payload = cached
+            if now < expires_at:
+                _token_cache.move_to_end(token)
+                return payload
+            del _token_cache[token]
+
     try:
-        return jwt.decode(
+        payload = jwt.decode(
             token,
             SECRET_KEY,
             algorithms=[ALGORITHM]
         )
     except JWTError:
         return None
+
+    expires_at = now + TOKEN_CACHE_TTL
+    if "exp" in payload:
+        expires_at = min(expires_at, payload["exp"])
+
+    with _token_cache_lock:
+        _token_cache[token] = (expires_at, payload)
+        if len(_token_cache) > TOKEN_CACHE_SIZE:
+            _token_cache.popitem(last=False)
+
+    return payload
@@ -0,0 +1,89 @@
+import asyncio
+
+from storage import db
+from core.config import CHAT_BATCH_SIZE, CHAT_FLUSH_INTERVAL, CHAT_QUEUE_SIZE
+
+
+# =========================================================
+# BATCHED MESSAGE WRITER
+# =========================================================
+# Both the REST endpoint and the WebSocket feed chat messages through
+# here. A single writer task drains the queue and persists up to
+# CHAT_BATCH_SIZE messages per transaction (or whatever arrived within
+# CHAT_FLUSH_INTERVAL), off the event loop. Ids are handed out inside
+# that transaction too, so the loop never waits on the id sequence (a
+# round trip under Mongo); a message gets its id when its batch lands.
+
+class MessageWriter:
+    def __init__(self):
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue(maxsize=CHAT_QUEUE_SIZE)
+            self._task = asyncio.create_task(self._run())
+
+    async def submit(self, message: dict) -> asyncio.Future:
+        # Returns a future that resolves to the stored message, id
+        # included, once it is durable. A full queue makes the caller
+        # wait (backpressure).
+        self._ensure_started()
+
+        done = asyncio.get_running_loop().create_future()
+        await self._queue.put((message, done))
+        return done
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+
+            batch = [item]
+            deadline = loop.time() + CHAT_FLUSH_INTERVAL
+
+            while len(batch) < CHAT_BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    await self._flush(batch)
+                    return
+                batch.append(item)
+
+            await self._flush(batch)
+
+    async def _flush(self, batch: list[tuple[dict, asyncio.Future]]):
+        try:
+            records = await db.awrite(self._write, [message for message, _ in batch])
+        except Exception as e:
+            for _, done in batch:
+                if not done.done():
+                    done.set_exception(e)
+        else:
+            for (_, done), record in zip(batch, records):
+                if not done.done():
+                    done.set_result(record)
+
+    def _write(self, messages: list[dict]) -> list[dict]:
+        # insert() takes the next id for each message inside the batch
+        with db.transaction():
+            return [db.insert("messages", message) for message in messages]
+
+    async def stop(self):
+        # Persist anything still queued before the process exits
+        if self._task is None or self._task.done():
+            return
+
+        await self._queue.put(None)
+        await self._task
+
+
+message_writer = MessageWriter()
@@ -1,18 +1,41 @@
 from fastapi import (
     APIRouter, Depends, HTTPException,
-    UploadFile, File, WebSocket,
+    Request, WebSocket,
     WebSocketDisconnect, Query
 )
 from pydantic import BaseModel
 from datetime import datetime
+import asyncio
+import hashlib
+import json
+import logging
 import os
+import time
 from uuid import uuid4
 
-from json_db import load_db, save_db
+try:
+    from python_multipart import MultipartParser
+    from python_multipart.exceptions import MultipartParseError
+    from python_multipart.multipart import parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart import MultipartParser
+    from multipart.exceptions import MultipartParseError
+    from multipart.multipart import parse_options_header
+
+from storage import db
 from role_utils import get_payload
+from membership_utils import is_member
+from chat_pipeline import message_writer
+from responses import FastJSONResponse
+from pubsub import Broker, LocalBroker, create_broker
 from auth_utils import decode_token
+from core.config import (
+    WS_SEND_QUEUE_SIZE, WS_SEND_TIMEOUT, WS_SLOW_CONSUMER_POLICY,
+    MAX_UPLOAD_BYTES, UPLOAD_CHUNK_SIZE
+)
 
 router = APIRouter(prefix="/chat", tags=["Chat"])
+logger = logging.getLogger(__name__)
 
 # ================= UPLOAD CONFIG =================
 
@@ -20,20 +43,85 @@ UPLOAD_DIR = "uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 # ================= CONNECTION MANAGER =================
+# broadcast() serializes once and publishes to the pub/sub broker; every
+# worker (this one included) gets it back in _deliver() and hands it to
+# its own sockets. Each socket has a bounded outbound queue drained by
+# its own sender task. A consumer that falls behind loses its oldest
+# pending messages ("drop_oldest") or is disconnected ("evict"), and
+# never holds up the rest of the group: an evicted socket leaves the group
+# at once and its close handshake runs in the background.
+
+class Connection:
+    def __init__(self, group_id: int, websocket: WebSocket):
+        self.group_id = group_id
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=WS_SEND_QUEUE_SIZE)
+        self.sender: asyncio.Task | None = None
+
+
+class FanoutStats:
+    def __init__(self):
+        self.messages = 0
+        self.deliveries = 0
+        self.dropped = 0
+        self.evicted = 0
+        self.last_ms = 0.0
+        self.avg_ms = 0.0
+        self.max_ms = 0.0
+
+    def record_delivery(self, latency_ms: float):
+        self.deliveries += 1
+        self.last_ms = latency_ms
+        self.max_ms = max(self.max_ms, latency_ms)
+        # Exponential moving average, recent deliveries weigh most
+        self.avg_ms += (latency_ms - self.avg_ms) * 0.1
+
+    def as_dict(self) -> dict:
+        return {
+            "messages": self.messages,
+            "deliveries": self.deliveries,
+            "dropped": self.dropped,
+            "evicted": self.evicted,
+            "last_ms": round(self.last_ms, 2),
+            "avg_ms": round(self.avg_ms, 2),
+            "max_ms": round(self.max_ms, 2)
+        }
+
 
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: dict[int, list[WebSocket]] = {}
+    def __init__(self, broker: Broker):
+        self.active_connections: dict[int, dict[WebSocket, Connection]] = {}
+        self.stats: dict[int, FanoutStats] = {}
+        self.broker = broker
+        self._started = False
+        # The loop only keeps weak references to tasks
+        self._closing: set[asyncio.Task] = set()
+
+    async def start(self):
+        if not self._started:
+            self._started = True
+            await self.broker.start(self._on_publish)
+
+    async def stop(self):
+        if self._started:
+            self._started = False
+            await self.broker.stop()
 
     async def connect(self, group_id: int, websocket: WebSocket):
-        self.active_connections.setdefault(group_id, []).append(websocket)
+        conn = Connection(group_id, websocket)
+        conn.sender = asyncio.create_task(self._send_loop(conn))
+        self.active_connections.setdefault(group_id, {})[websocket] = conn
 
     def disconnect(self, group_id: int, websocket: WebSocket):
-        if group_id in self.active_connections:
-            if websocket in self.active_connections[group_id]:
-                self.active_connections[group_id].remove(websocket)
-            if not self.active_connections[group_id]:
-                del self.active_connections[group_id]
+        conns = self.active_connections.get(group_id)
+        if conns is None:
+            return
+
+        conn = conns.pop(websocket, None)
+        if conn and conn.sender and conn.sender is not asyncio.current_task():
+            conn.sender.cancel()
+        if not conns:
+            del self.active_connections[group_id]
 
     async def broadcast(self, group_id: int, message: dict):
         # 🔐 ENSURE NO BYTES EVER
@@ -41,111 +129,390 @@ class ConnectionManager:
             if isinstance(v, (bytes, bytearray)):
                 raise ValueError(f"❌ BYTES FOUND IN PAYLOAD: {k}")
 
-        for ws in self.active_connections.get(group_id, []):
-            await ws.send_json(message)
+        if not self._started:
+            # Not running under the app lifespan (e.g. a bare router)
+            self.broker = LocalBroker()
+            await self.start()
+
+        await self.broker.publish(f"chat:{group_id}", json.dumps(message))
+
+    async def _on_publish(self, channel: str, text: str):
+        if not channel.startswith("chat:"):
+            return
+        group_id = int(channel.split(":", 1)[1])
+        await self._deliver(group_id, text)
+
+    async def _deliver(self, group_id: int, text: str):
+        sent_at = time.perf_counter()
+        stats = self.stats.setdefault(group_id, FanoutStats())
+        stats.messages += 1
+
+        for conn in list(self.active_connections.get(group_id, {}).values()):
+            try:
+                conn.queue.put_nowait((text, sent_at))
+            except asyncio.QueueFull:
+                if WS_SLOW_CONSUMER_POLICY == "evict":
+                    stats.evicted += 1
+                    self._evict(conn)
+                else:
+                    stats.dropped += 1
+                    conn.queue.get_nowait()
+                    conn.queue.put_nowait((text, sent_at))
+
+    async def _send_loop(self, conn: Connection):
+        stats = self.stats.setdefault(conn.group_id, FanoutStats())
+        try:
+            while True:
+                text, sent_at = await conn.queue.get()
+                await asyncio.wait_for(
+                    conn.websocket.send_text(text), WS_SEND_TIMEOUT
+                )
+                stats.record_delivery((time.perf_counter() - sent_at) * 1000)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Dead or stuck socket: stop sending to it
+            stats.evicted += 1
+            self._evict(conn)
+
+    def _evict(self, conn: Connection):
+        self.disconnect(conn.group_id, conn.websocket)
+        task = asyncio.create_task(self._close(conn.websocket))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    @staticmethod
+    async def _close(websocket: WebSocket):
+        # A stalled client can hold up the close handshake; don't wait forever
+        try:
+            await asyncio.wait_for(websocket.close(), WS_SEND_TIMEOUT)
+        except Exception:
+            pass
+
+    def fanout_stats(self) -> dict:
+        return {
+            group_id: {
+                "connections": len(self.active_connections.get(group_id, {})),
+                **stats.as_dict()
+            }
+            for group_id, stats in self.stats.items()
+        }
 
-manager = ConnectionManager()
+manager = ConnectionManager(create_broker())
 
 # ================= SCHEMA =================
 
+FILE_FIELDS = ("file_url", "file_name", "file_type")
+
+def sender_names(messages) -> dict[int, str]:
+    # Looked up once per page of messages, not once per message
+    users = db.get_many("users", (m["sender_id"] for m in messages))
+    return {
+        user_id: user.get("name", user.get("email"))
+        for user_id, user in users.items()
+    }
+
+def chat_payload(m: dict, senders: dict[int, str] | None = None) -> dict:
+    # Shape shared by chat history and live WebSocket messages
+    if senders is None:
+        senders = sender_names([m])
+    payload = {
+        "id": m["id"],
+        "sender_id": m["sender_id"],
+        "sender": senders.get(m["sender_id"], "Unknown"),
+        "time": m["timestamp"],
+        "type": m.get("type", "text")
+    }
+
+    if payload["type"] == "file":
+        for field in FILE_FIELDS:
+            payload[field] = m.get(field)
+    else:
+        payload["message"] = m.get("message")
+
+    return payload
+
 class MessageCreate(BaseModel):
     message: str
 
+class MessageOut(BaseModel):
+    id: int
+    sender_id: int
+    sender: str | None = None
+    time: str
+    type: str = "text"
+    message: str | None = None
+    file_url: str | None = None
+    file_name: str | None = None
+    file_type: str | None = None
+
+# ================= FILE / IMAGE UPLOAD =================
+# Declared before POST /{group_id} so "upload" isn't parsed as a group id.
+# The multipart body is parsed straight off request.stream(): the "file"
+# part is hashed and written to disk as its bytes arrive, and the size
+# limit applies at the same time, so an oversized upload is cut off
+# (or refused on Content-Length) instead of being received in full first.
+# The file is stored under its SHA-256: re-uploading the same file reuses
+# the stored copy.
+
+# room for the part headers and boundaries around the file itself
+MULTIPART_OVERHEAD = 64 * 1024
+
+class UploadTooLarge(Exception):
+    pass
+
+class _UploadSink:
+    def __init__(self):
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.tmp_path = os.path.join(UPLOAD_DIR, f".{uuid4()}.part")
+        self.file = open(self.tmp_path, "wb")
+
+    def write(self, data: bytes):
+        self.size += len(data)
+        if self.size > MAX_UPLOAD_BYTES:
+            raise UploadTooLarge()
+        self.digest.update(data)
+        self.file.write(data)
+
+    def finish(self, ext: str) -> str:
+        self.file.close()
+        name = self.digest.hexdigest() + ext
+        path = os.path.join(UPLOAD_DIR, name)
+        if os.path.exists(path):
+            os.remove(self.tmp_path)
+        else:
+            os.replace(self.tmp_path, path)
+        return name
+
+    def discard(self):
+        self.file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+class _UploadParser:
+    def __init__(self, boundary: bytes):
+        self.sink = None
+        self.filename = None
+        self.content_type = None
+        self.done = False
+        self._in_file = False
+        self._headers = {}
+        self._field = b""
+        self._value = b""
+        self.parser = MultipartParser(boundary, {
+            "on_part_begin": self._part_begin,
+            "on_header_field": self._header_field,
+            "on_header_value": self._header_value,
+            "on_header_end": self._header_end,
+            "on_headers_finished": self._headers_finished,
+            "on_part_data": self._part_data,
+            "on_part_end": self._part_end,
+        })
+
+    def _part_begin(self):
+        self._headers = {}
+        self._field = self._value = b""
+
+    def _header_field(self, data, start, end):
+        self._field += data[start:end]
+
+    def _header_value(self, data, start, end):
+        self._value += data[start:end]
+
+    def _header_end(self):
+        self._headers[self._field.lower()] = self._value
+        self._field = self._value = b""
+
+    def _headers_finished(self):
+        _, options = parse_options_header(
+            self._headers.get(b"content-disposition", b"")
+        )
+        # only the first part named "file" is kept, other fields are skipped
+        self._in_file = (
+            options.get(b"name") == b"file"
+            and b"filename" in options
+            and self.sink is None
+        )
+        if self._in_file:
+            self.filename = options[b"filename"].decode("utf-8", "replace")
+            self.content_type = (
+                self._headers.get(b"content-type", b"").decode("latin-1") or None
+            )
+            self.sink = _UploadSink()
+
+    def _part_data(self, data, start, end):
+        if self._in_file:
+            self.sink.write(data[start:end])
+
+    def _part_end(self):
+        if self._in_file:
+            self._in_file = False
+            self.done = True
+
+    def write(self, chunk: bytes):
+        self.parser.write(chunk)
+
+    def discard(self):
+        if self.sink is not None:
+            self.sink.discard()
+
+def _too_large() -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"File exceeds {MAX_UPLOAD_BYTES // (1024 * 1024)} MB limit"
+    )
+
+@router.post("/upload")
+async def upload_file(request: Request):
+    body_limit = MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD
+
+    length = request.headers.get("content-length")
+    if length is not None and length.isdigit() and int(length) > body_limit:
+        raise _too_large()
+
+    content_type, options = parse_options_header(
+        request.headers.get("content-type", "")
+    )
+    boundary = options.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise HTTPException(status_code=422, detail="Expected a multipart file upload")
+
+    upload = _UploadParser(boundary)
+    received = 0
+    buffer = bytearray()
+
+    try:
+        # disk writes happen inside parser callbacks, so the parser runs
+        # off the event loop, fed in UPLOAD_CHUNK_SIZE batches
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > body_limit:
+                raise UploadTooLarge()
+            buffer += chunk
+            if len(buffer) >= UPLOAD_CHUNK_SIZE:
+                await asyncio.to_thread(upload.write, bytes(buffer))
+                buffer.clear()
+        if buffer:
+            await asyncio.to_thread(upload.write, bytes(buffer))
+
+        if not upload.done:
+            raise HTTPException(status_code=422, detail="No file in upload")
+
+        ext = os.path.splitext(upload.filename or "")[1].lower()
+        if not ext[1:].isalnum() or len(ext) > 10:
+            ext = ""
+        unique_name = await asyncio.to_thread(upload.sink.finish, ext)
+
+    except UploadTooLarge:
+        upload.discard()
+        raise _too_large()
+    except MultipartParseError:
+        upload.discard()
+        raise HTTPException(status_code=422, detail="Malformed multipart body")
+    except OSError as e:
+        upload.discard()
+        raise HTTPException(status_code=500, detail=str(e))
+    except BaseException:
+        upload.discard()
+        raise
+
+    return {
+        "file_url": f"/uploads/{unique_name}",
+        "file_name": upload.filename,
+        "file_type": upload.content_type
+    }
+
 # ================= REST: SEND TEXT MESSAGE =================
 
 @router.post("/{group_id}")
-def send_message(
+async def send_message(
     group_id: int,
     data: MessageCreate,
     payload: dict = Depends(get_payload)
 ):
-    db = load_db()
     user_id = payload["user_id"]
 
-    if not any(
-        gm["group_id"] == group_id and gm["user_id"] == user_id
-        for gm in db.get("group_members", [])
-    ):
+    if not await db.aread(is_member, group_id, user_id):
         raise HTTPException(status_code=403, detail="Not allowed")
 
-    msg = {
-        "id": len(db.get("messages", [])) + 1,
+    persisted = await message_writer.submit({
         "group_id": group_id,
         "sender_id": user_id,
+        "type": "text",
         "message": data.message,
         "timestamp": datetime.utcnow().isoformat()
-    }
-
-    db.setdefault("messages", []).append(msg)
-    save_db(db)
+    })
+    msg = await persisted
 
+    await manager.broadcast(group_id, await db.aread(chat_payload, msg))
     return msg
 
+# ================= FAN-OUT STATS (ADMIN) =================
+
+@router.get("/stats/fanout")
+async def get_fanout_stats(payload: dict = Depends(get_payload)):
+    if payload.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Admins only")
+
+    return manager.fanout_stats()
+
 # ================= GET GROUP MESSAGES =================
 
-@router.get("/{group_id}")
-def get_messages(group_id: int, payload: dict = Depends(get_payload)):
-    db = load_db()
+@router.get("/{group_id}", response_model=list[MessageOut])
+async def get_messages(
+    group_id: int,
+    before: int | None = Query(None, description="Return messages older than this id"),
+    after: int | None = Query(None, description="Return messages newer than this id"),
+    limit: int = Query(50, ge=1, le=200),
+    payload: dict = Depends(get_payload)
+):
     user_id = payload["user_id"]
     role = payload.get("role")
 
-    is_member = any(
-        gm["group_id"] == group_id and gm["user_id"] == user_id
-        for gm in db.get("group_members", [])
-    )
-
-    if role != "admin" and not is_member:
+    if role != "admin" and not await db.aread(is_member, group_id, user_id):
         raise HTTPException(status_code=403, detail="Not allowed")
 
-    result = []
-    for m in db.get("messages", []):
-        if m["group_id"] == group_id:
-            user = next(
-                (u for u in db.get("users", []) if u["id"] == m["sender_id"]),
-                None
-            )
-            result.append({
-                "sender_id": m["sender_id"],
-                "sender": user.get("name", user.get("email")) if user else "Unknown",
-                "message": m["message"],
-                "time": m["timestamp"],
-                "type": "text"
-            })
-
-    return result
-
-# ================= FILE / IMAGE UPLOAD =================
-
-@router.post("/upload")
-def upload_file(file: UploadFile = File(...)):
-    try:
-        print("UPLOAD STARTED")
-        print("Filename:", file.filename)
-        print("Content-Type:", file.content_type)
-
-        ext = file.filename.split(".")[-1]
-        unique_name = f"{uuid4()}.{ext}"
-        path = os.path.join(UPLOAD_DIR, unique_name)
+    messages = await db.aread(_history_page, group_id, before, after, limit)
+    return FastJSONResponse(messages)
 
-        with open(path, "wb") as f:
-            content = file.file.read()
-            print("BYTES SIZE:", len(content))
-            f.write(content)
 
-        print("UPLOAD SUCCESS")
-
-        return {
-            "file_url": f"/uploads/{unique_name}",
-            "file_name": file.filename,
-            "file_type": file.content_type
-        }
+def _history_page(group_id: int, before, after, limit: int) -> list[dict]:
+    page = db.page(
+        "messages", "group_id", group_id,
+        before=before, after=after, limit=limit
+    )
 
-    except Exception as e:
-        print("UPLOAD ERROR:", e)
-        raise HTTPException(status_code=500, detail=str(e))
+    senders = sender_names(page)
+    return [chat_payload(m, senders) for m in page]
 
 # ================= WEBSOCKET CHAT =================
 
+def _log_unsaved(persisted: asyncio.Future):
+    # The socket loop doesn't await a message's write, so a failed batch
+    # is reported here instead of being lost with the future
+    if not persisted.cancelled() and persisted.exception() is not None:
+        logger.error(
+            "chat message could not be stored", exc_info=persisted.exception()
+        )
+
+# The loop only keeps weak references to tasks
+_relays: set[asyncio.Task] = set()
+
+async def _relay(group_id: int, pending: asyncio.Queue):
+    # A message only has an id once its batch is stored, so each socket
+    # broadcasts its messages from here, in the order they were sent,
+    # while the socket loop goes on reading. None ends the relay.
+    while (persisted := await pending.get()) is not None:
+        try:
+            msg = await persisted
+        except Exception:
+            continue  # logged by _log_unsaved
+        try:
+            await manager.broadcast(group_id, await db.aread(chat_payload, msg))
+        except Exception:
+            logger.exception("chat message could not be broadcast")
+
 @router.websocket("/ws/{group_id}")
 async def websocket_chat(
     websocket: WebSocket,
@@ -162,42 +529,53 @@ async def websocket_chat(
         return
 
     sender_id = payload["user_id"]
-    db = load_db()
+
+    if payload.get("role") != "admin" and not await db.aread(is_member, group_id, sender_id):
+        await websocket.close()
+        return
 
     await manager.connect(group_id, websocket)
     print("WS CONNECTED FOR USER", sender_id)
 
+    pending: asyncio.Queue = asyncio.Queue()
+    relay = asyncio.create_task(_relay(group_id, pending))
+    _relays.add(relay)
+    relay.add_done_callback(_relays.discard)
+
     try:
         while True:
             data = await websocket.receive_json()
             msg_type = data.get("type", "text")
 
-            user = next(
-                (u for u in db.get("users", []) if u["id"] == sender_id),
-                None
-            )
-
-            base_payload = {
+            record = {
+                "group_id": group_id,
                 "sender_id": sender_id,
-                "sender": user.get("name", user.get("email")) if user else "Unknown",
-                "time": datetime.utcnow().isoformat(),
-                "type": msg_type
+                "type": msg_type,
+                "timestamp": datetime.utcnow().isoformat()
             }
 
             if msg_type == "text":
                 message = data.get("message")
                 if not message:
                     continue
-                base_payload["message"] = message
+                record["message"] = message
 
             elif msg_type == "file":
                 # ✅ ONLY STRINGS — NO BYTES
-                base_payload["file_url"] = str(data.get("file_url"))
-                base_payload["file_name"] = str(data.get("file_name"))
-                base_payload["file_type"] = str(data.get("file_type"))
+                for field in FILE_FIELDS:
+                    record[field] = str(data.get(field))
+
+            else:
+                continue
 
-            await manager.broadcast(group_id, base_payload)
+            # Persisted in the next batch; _relay broadcasts it once stored
+            persisted = await message_writer.submit(record)
+            persisted.add_done_callback(_log_unsaved)
+            pending.put_nowait(persisted)
 
     except WebSocketDisconnect:
         print("CLIENT DISCONNECTED")
+    finally:
         manager.disconnect(group_id, websocket)
+        # Let the relay finish broadcasting what was already sent
+        pending.put_nowait(None)
@@ -0,0 +1,126 @@
+import asyncio
+import gzip
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from core.config import COMPRESS_MIN_SIZE, GZIP_LEVEL, BROTLI_QUALITY
+
+try:
+    import brotli  # optional: only gzip is offered without it
+except ImportError:
+    brotli = None
+
+
+# =========================================================
+# RESPONSE COMPRESSION
+# =========================================================
+# Compresses whole-body 200 responses of at least COMPRESS_MIN_SIZE bytes
+# with the best encoding the client accepts (br, then gzip). Left alone:
+# the /uploads mount and any other file response (they advertise byte
+# ranges and carry a strong ETag of the stored bytes), partial content,
+# bodies streamed in several chunks and anything already encoded. Large
+# bodies are compressed off the event loop.
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "image/svg+xml")
+OFFLOAD_SIZE = 256 * 1024
+EXCLUDED_PATHS = ("/uploads/",)
+
+
+def accepted_encodings(header: str) -> dict[str, float]:
+    accepted = {}
+    for part in header.split(","):
+        name, _, params = part.partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[name] = q
+    return accepted
+
+
+def choose_encoding(header: str) -> str | None:
+    accepted = accepted_encodings(header)
+    wildcard = accepted.get("*", 0.0)
+    offered = ("br", "gzip") if brotli is not None else ("gzip",)
+
+    # Highest q wins; on a tie the earlier (smaller) encoding
+    best = max(offered, key=lambda e: accepted.get(e, wildcard))
+    return best if accepted.get(best, wildcard) > 0 else None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(EXCLUDED_PATHS):
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, passthrough
+
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                start = message
+                return
+
+            passthrough = True
+            if message["type"] != "http.response.body":
+                await send(start)
+                await send(message)
+                return
+
+            headers = MutableHeaders(raw=start["headers"])
+            body = message.get("body", b"")
+
+            if (
+                start["status"] != 200
+                or "content-range" in headers
+                or "accept-ranges" in headers
+                or message.get("more_body", False)
+                or len(body) < self.minimum_size
+                or "content-encoding" in headers
+                or not headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+            ):
+                await send(start)
+                await send(message)
+                return
+
+            if len(body) >= OFFLOAD_SIZE:
+                body = await asyncio.to_thread(compress, body, encoding)
+            else:
+                body = compress(body, encoding)
+
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(body))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
@@ -6,3 +6,70 @@ load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_HOURS = 8
+
+# ---------------- STORAGE ----------------
+DB_FSYNC = os.getenv("DB_FSYNC", "true").lower() == "true"
+DB_COMPACT_BYTES = int(os.getenv("DB_COMPACT_BYTES", str(4 * 1024 * 1024)))
+DB_COMPACT_INTERVAL = float(os.getenv("DB_COMPACT_INTERVAL", "30"))  # seconds
+# Deletions remembered for GET /tasks/changes; older clients get a reset
+CHANGE_LOG_SIZE = int(os.getenv("CHANGE_LOG_SIZE", "10000"))
+
+# ---------------- CHAT ----------------
+CHAT_BATCH_SIZE = int(os.getenv("CHAT_BATCH_SIZE", "100"))
+CHAT_FLUSH_INTERVAL = float(os.getenv("CHAT_FLUSH_INTERVAL", "0.05"))  # seconds
+CHAT_QUEUE_SIZE = int(os.getenv("CHAT_QUEUE_SIZE", "10000"))
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "100"))
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "10"))  # seconds
+WS_SLOW_CONSUMER_POLICY = os.getenv("WS_SLOW_CONSUMER_POLICY", "drop_oldest")  # or "evict"
+
+# ---------------- PUB/SUB ----------------
+# "local" keeps chat fan-out inside one process; "unix" relays it between
+# uvicorn workers on the same host through a Unix socket.
+PUBSUB_BACKEND = os.getenv("PUBSUB_BACKEND", "local")
+PUBSUB_SOCKET = os.getenv("PUBSUB_SOCKET", "/tmp/taskmanager-pubsub.sock")
+
+# ---------------- EVENTS ----------------
+# Recent task/notification events each worker keeps for /events/ws resume
+EVENT_BUFFER_SIZE = int(os.getenv("EVENT_BUFFER_SIZE", "1000"))
+
+# ---------------- AUTH ----------------
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+TOKEN_CACHE_TTL = float(os.getenv("TOKEN_CACHE_TTL", "300"))  # seconds
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_POOL_SIZE = int(os.getenv("PASSWORD_POOL_SIZE", str(max(1, (os.cpu_count() or 2) // 2))))
+PASSWORD_QUEUE_DEPTH = int(os.getenv("PASSWORD_QUEUE_DEPTH", "32"))  # waiting jobs before 429
+
+# ---------------- TASKS ----------------
+TASK_BULK_LIMIT = int(os.getenv("TASK_BULK_LIMIT", "5000"))  # operations per POST /tasks/bulk
+
+# ---------------- ACTIVITY LOG ----------------
+# Entries older than this move to gzip segments in ACTIVITY_ARCHIVE_DIR (0 = keep all)
+ACTIVITY_RETENTION_DAYS = int(os.getenv("ACTIVITY_RETENTION_DAYS", "90"))
+ACTIVITY_ARCHIVE_DIR = os.getenv("ACTIVITY_ARCHIVE_DIR", "archive")
+ACTIVITY_ARCHIVE_INTERVAL = float(os.getenv("ACTIVITY_ARCHIVE_INTERVAL", "3600"))  # seconds
+ACTIVITY_ARCHIVE_BATCH = int(os.getenv("ACTIVITY_ARCHIVE_BATCH", "5000"))  # entries per segment
+
+# ---------------- SEARCH ----------------
+SEARCH_PREFIX_EXPANSION = int(os.getenv("SEARCH_PREFIX_EXPANSION", "50"))  # terms one prefix can match
+
+# ---------------- RESPONSES ----------------
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))  # bytes; smaller bodies are sent as-is
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))  # 0-11; used when brotli is installed
+
+# ---------------- SCHEDULER ----------------
+SCHEDULER_POLL_INTERVAL = float(os.getenv("SCHEDULER_POLL_INTERVAL", "60"))  # seconds
+
+# ---------------- UPLOADS ----------------
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "25")) * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# ---------------- STORAGE BACKEND ----------------
+# "json" (data.json + append-only log) or "mongo"
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "json")
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")  # "mongomock://" for tests
+MONGO_DB = os.getenv("MONGO_DB", "taskmanager")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "10"))
+MONGO_MAX_IDLE_MS = int(os.getenv("MONGO_MAX_IDLE_MS", "60000"))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "2000"))
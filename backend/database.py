@@ -1,9 +1,463 @@
 # backend/database.py
-from pymongo import MongoClient # type: ignore
-import os
-
-MONGO_URI = os.environ.get("MONGO_URI", "mongodb://localhost:27017")
-client = MongoClient(MONGO_URI)
-db = client["taskmanager"]
-users_collection = db["users"]
-tasks_collection = db["tasks"]
+import asyncio
+import functools
+import re
+import threading
+import time
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from pymongo import MongoClient, ReturnDocument, InsertOne, UpdateOne, DeleteOne, DeleteMany # type: ignore
+from pymongo.errors import DuplicateKeyError # type: ignore
+
+from repository import (
+    Repository, VersionConflict, COLLECTIONS, PRIMARY_KEYS, REVISIONED,
+    TOMBSTONE_FIELDS
+)
+from core.config import (
+    MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE,
+    MONGO_MAX_IDLE_MS, MONGO_WAIT_QUEUE_TIMEOUT_MS
+)
+
+# (keys, options) per collection, created on load()
+INDEXES = {
+    "users": [
+        ([("id", 1)], {"unique": True}),
+        ([("email", 1)], {"unique": True}),
+    ],
+    "tasks": [
+        ([("id", 1)], {"unique": True}),
+        ([("assigned_to", 1), ("status", 1)], {}),
+        ([("status", 1), ("priority", 1)], {}),
+        ([("due_date", 1)], {}),
+        ([("rev", 1)], {}),
+    ],
+    "activity_logs": [
+        ([("id", 1)], {"unique": True}),
+        ([("task_id", 1), ("id", 1)], {}),
+        ([("timestamp", 1), ("id", 1)], {}),
+    ],
+    "notifications": [
+        ([("id", 1)], {"unique": True}),
+        ([("user_id", 1), ("id", 1)], {}),
+        ([("user_id", 1), ("read", 1)], {}),
+    ],
+    "groups": [
+        ([("id", 1)], {"unique": True}),
+    ],
+    "group_members": [
+        ([("group_id", 1), ("user_id", 1)], {"unique": True}),
+        ([("user_id", 1)], {}),
+    ],
+    "messages": [
+        ([("id", 1)], {"unique": True}),
+        ([("group_id", 1), ("id", 1)], {}),
+    ],
+    "tombstones": [
+        ([("collection", 1), ("rev", 1)], {}),
+    ],
+}
+
+NO_ID = {"_id": 0}
+_DELETED = object()
+
+
+# =========================================================
+# MONGODB BACKEND
+# =========================================================
+# Same contract as the JSON engine. Writes made inside a transaction are
+# buffered and sent as one ordered bulk_write per collection when it
+# ends; get() sees the transaction's own writes, while find(), range()
+# and page() read committed data. Ids come from a "counters" collection.
+# Without a replica set, a transaction spanning several collections is
+# not atomic across them.
+#
+# Revisions come from the same counters; deletes in REVISIONED collections
+# (and updates that change a TOMBSTONE_FIELDS value) leave a document in
+# "tombstones" for changes(). Updates only $set the fields they change,
+# and in REVISIONED collections they (and deletes) only match the
+# revision they read, so a writer in another process is never silently
+# overwritten: the commit raises VersionConflict instead.
+# Every commit also bumps a "version:<collection>" counter per collection
+# it wrote, which version() reads for conditional GETs in any process.
+#
+# The store is shared by every worker, so counts, word matches and
+# leases are answered by MongoDB rather than by per-process state.
+# match_words() is a regex scan on the server, not an index lookup.
+
+class _Txn:
+    def __init__(self):
+        self.ops: list[tuple[str, object]] = []
+        self.guarded: dict[str, int] = {}  # ops per collection that must match
+        self.overlay: dict[tuple, object] = {}
+        self.changes: list[tuple[str, dict | None, dict | None]] = []
+        self.after: list = []
+
+
+class MongoDB(Repository):
+
+    shared = True
+
+    def __init__(self, uri: str, name: str):
+        self.uri = uri
+        self.name = name
+        self._client = None
+        self._db = None
+        self._connect_lock = threading.Lock()
+        self._listener_lock = threading.RLock()
+        self._listeners: dict[str, list] = {}
+        self._txn = threading.local()
+        # pymongo's client is blocking and thread-safe: async handlers run
+        # their queries here, one thread per pooled connection
+        self._executor = ThreadPoolExecutor(
+            max_workers=MONGO_MAX_POOL_SIZE, thread_name_prefix="mongo"
+        )
+
+    # ---------------- CONNECTION ----------------
+
+    @property
+    def mongo(self):
+        if self._db is None:
+            with self._connect_lock:
+                if self._db is None:
+                    self._client = self._make_client()
+                    self._db = self._client[self.name]
+        return self._db
+
+    def _make_client(self):
+        if self.uri.startswith("mongomock://"):
+            import mongomock  # test-only dependency
+            return mongomock.MongoClient()
+
+        return MongoClient(
+            self.uri,
+            maxPoolSize=MONGO_MAX_POOL_SIZE,
+            minPoolSize=MONGO_MIN_POOL_SIZE,
+            maxIdleTimeMS=MONGO_MAX_IDLE_MS,
+            waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+            retryWrites=True
+        )
+
+    def load(self):
+        for collection in (*COLLECTIONS, "tombstones"):
+            for keys, options in INDEXES.get(collection, []):
+                self.mongo[collection].create_index(keys, **options)
+
+            # Counters never fall behind ids already stored
+            if collection in COLLECTIONS and collection not in PRIMARY_KEYS:
+                last = self.mongo[collection].find_one({}, {"id": 1}, sort=[("id", -1)])
+                if last:
+                    self.mongo["counters"].update_one(
+                        {"_id": collection},
+                        {"$max": {"seq": last["id"]}},
+                        upsert=True
+                    )
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+
+    def _filter(self, collection: str, key) -> dict:
+        fields = PRIMARY_KEYS.get(collection, ("id",))
+        values = key if len(fields) > 1 else (key,)
+        return dict(zip(fields, values))
+
+    def _sort(self, collection: str) -> list[tuple[str, int]]:
+        return [(f, 1) for f in PRIMARY_KEYS.get(collection, ("id",))]
+
+    # ---------------- READS ----------------
+
+    def get(self, collection: str, key) -> dict | None:
+        txn = getattr(self._txn, "current", None)
+        if txn is not None:
+            pending = txn.overlay.get((collection, key))
+            if pending is _DELETED:
+                return None
+            if pending is not None:
+                return pending
+
+        return self.mongo[collection].find_one(self._filter(collection, key), NO_ID)
+
+    def get_many(self, collection: str, keys) -> dict:
+        # One query; sees committed data, like find()
+        if collection in PRIMARY_KEYS:
+            return super().get_many(collection, keys)
+        cursor = self.mongo[collection].find({"id": {"$in": list(set(keys))}}, NO_ID)
+        return {record["id"]: record for record in cursor}
+
+    def all(self, collection: str) -> list[dict]:
+        return list(self.mongo[collection].find({}, NO_ID).sort(self._sort(collection)))
+
+    def find(self, collection: str, **criteria) -> list[dict]:
+        cursor = self.mongo[collection].find(criteria, NO_ID)
+        return list(cursor.sort(self._sort(collection)))
+
+    def range(self, collection: str, field: str, start=None, end=None,
+              limit: int | None = None) -> list[dict]:
+        bounds = {"$ne": None}
+        if start is not None:
+            bounds["$gte"] = start
+        if end is not None:
+            bounds["$lt"] = end
+
+        cursor = self.mongo[collection].find({field: bounds}, NO_ID)
+        cursor = cursor.sort([(field, 1), *self._sort(collection)])
+        if limit is not None:
+            cursor = cursor.limit(limit)
+        return list(cursor)
+
+    def page(self, collection: str, field: str, value, before=None,
+             after=None, limit: int = 50) -> list[dict]:
+        query = {field: value}
+
+        if after is not None:
+            query["id"] = {"$gt": after}
+            cursor = self.mongo[collection].find(query, NO_ID).sort("id", 1)
+            return list(cursor.limit(limit))
+
+        if before is not None:
+            query["id"] = {"$lt": before}
+        cursor = self.mongo[collection].find(query, NO_ID).sort("id", -1)
+        return list(cursor.limit(limit))[::-1]
+
+    def count(self, collection: str, **criteria) -> int:
+        if criteria:
+            return self.mongo[collection].count_documents(criteria)
+        return self.mongo[collection].estimated_document_count()
+
+    def count_by(self, collection: str, field: str, **criteria) -> dict:
+        groups = self.mongo[collection].aggregate([
+            {"$match": criteria},
+            {"$group": {"_id": "$" + field, "n": {"$sum": 1}}}
+        ])
+        return {g["_id"]: g["n"] for g in groups}
+
+    def _words_query(self, fields, words) -> dict:
+        return {"$and": [
+            {"$or": [
+                {f: {"$regex": r"(?<!\w)" + re.escape(w), "$options": "i"}}
+                for f in fields
+            ]}
+            for w in words
+        ]}
+
+    def match_words(self, collection: str, fields, words) -> list[dict]:
+        return list(self.mongo[collection].find(self._words_query(fields, words), NO_ID))
+
+    def count_words(self, collection: str, fields, words) -> int:
+        return self.mongo[collection].count_documents(self._words_query(fields, words))
+
+    def revision(self, collection: str) -> int:
+        counter = self.mongo["counters"].find_one({"_id": "rev:" + collection})
+        return counter["seq"] if counter else 0
+
+    def version(self, *collections: str) -> str:
+        ids = ["version:" + c for c in collections]
+        found = self.mongo["counters"].find({"_id": {"$in": ids}})
+        seqs = {counter["_id"]: counter["seq"] for counter in found}
+        return ".".join(str(seqs.get(i, 0)) for i in ids)
+
+    def changes(self, collection: str, since: int) -> dict | None:
+        rev = self.revision(collection)
+        if not 0 <= since <= rev:
+            return None
+
+        after = {"$gt": since}
+        upserts = self.mongo[collection].find({"rev": after}, NO_ID).sort("rev", 1)
+        fields = TOMBSTONE_FIELDS.get(collection, ())
+        deleted = self.mongo["tombstones"].find(
+            {"collection": collection, "rev": after},
+            {"_id": 0, "key": 1, "moved": 1, **{f: 1 for f in fields}}
+        ).sort("rev", 1)
+
+        return {
+            "rev": rev,
+            "upserts": list(upserts),
+            "deleted": list(deleted)
+        }
+
+    # ---------------- WRITES ----------------
+
+    @contextmanager
+    def transaction(self):
+        if getattr(self._txn, "current", None) is not None:
+            yield self
+            return
+
+        txn = self._txn.current = _Txn()
+        try:
+            yield self
+        finally:
+            self._txn.current = None
+
+        self._commit(txn)
+
+    def _commit(self, txn: _Txn):
+        by_collection: dict[str, list] = {}
+        for collection, op in txn.ops:
+            by_collection.setdefault(collection, []).append(op)
+
+        written = []
+        try:
+            for collection, ops in by_collection.items():
+                written.append(collection)
+                result = self.mongo[collection].bulk_write(ops, ordered=True)
+                guarded = txn.guarded.get(collection, 0)
+                if result.matched_count + result.deleted_count < guarded:
+                    raise VersionConflict(collection, None)
+        finally:
+            # Also after a failed bulk_write, which may have applied part
+            if written:
+                self.mongo["counters"].bulk_write([
+                    UpdateOne({"_id": "version:" + c}, {"$inc": {"seq": 1}}, upsert=True)
+                    for c in written
+                ])
+
+        with self._listener_lock:
+            for collection, old, new in txn.changes:
+                for listener in self._listeners.get(collection, ()):
+                    listener(old, new)
+
+        for callback in txn.after:
+            callback()
+
+    def after_commit(self, callback):
+        txn = getattr(self._txn, "current", None)
+        if txn is None:
+            callback()
+        else:
+            txn.after.append(callback)
+
+    def _stage(self, collection: str, key, op, old, new):
+        txn = self._txn.current
+        txn.ops.append((collection, op))
+        txn.overlay[(collection, key)] = _DELETED if new is None else new
+        txn.changes.append((collection, old, new))
+
+    def next_id(self, collection: str) -> int:
+        counter = self.mongo["counters"].find_one_and_update(
+            {"_id": collection},
+            {"$inc": {"seq": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return counter["seq"]
+
+    def next_rev(self, collection: str) -> int:
+        return self.next_id("rev:" + collection)
+
+    def _tombstone(self, collection: str, key, old: dict, new: dict | None = None):
+        if collection not in REVISIONED:
+            return
+        tombstone = self._tombstone_of(collection, key, old, new)
+        if tombstone is not None:
+            self._txn.current.ops.append(("tombstones", InsertOne({
+                "collection": collection,
+                **tombstone,
+                "rev": new["rev"] if new is not None else self.next_rev(collection),
+                "deleted_at": datetime.now().isoformat()
+            })))
+
+    def insert(self, collection: str, record: dict) -> dict:
+        with self.transaction():
+            if collection not in PRIMARY_KEYS and "id" not in record:
+                record = {"id": self.next_id(collection), **record}
+            record = self._stamp(collection, record)
+            # pymongo adds "_id" to the document it is given
+            self._stage(
+                collection, self.key(collection, record),
+                InsertOne(dict(record)), None, record
+            )
+        return record
+
+    def _guard(self, collection: str, key, old: dict, expected_rev) -> dict:
+        # Filter matching the record only at the revision we read
+        if expected_rev is not None and old.get("rev") != expected_rev:
+            raise VersionConflict(collection, key)
+
+        match = self._filter(collection, key)
+        if collection in REVISIONED:
+            match["rev"] = old.get("rev")
+            guarded = self._txn.current.guarded
+            guarded[collection] = guarded.get(collection, 0) + 1
+        return match
+
+    def update(self, collection: str, key, changes: dict,
+               expected_rev: int | None = None) -> dict | None:
+        with self.transaction():
+            old = self.get(collection, key)
+            if old is None:
+                return None
+            changes = self._stamp(collection, {
+                k: v for k, v in changes.items()
+                if k not in PRIMARY_KEYS.get(collection, ("id",))
+            })
+            match = self._guard(collection, key, old, expected_rev)
+            new = {**old, **changes}
+            self._stage(
+                collection, key,
+                UpdateOne(match, {"$set": dict(changes)}), old, new
+            )
+            self._tombstone(collection, key, old, new)
+        return new
+
+    def delete(self, collection: str, key,
+               expected_rev: int | None = None) -> dict | None:
+        with self.transaction():
+            old = self.get(collection, key)
+            if old is None:
+                return None
+            match = self._guard(collection, key, old, expected_rev)
+            self._stage(collection, key, DeleteOne(match), old, None)
+            self._tombstone(collection, key, old)
+        return old
+
+    def delete_where(self, collection: str, **criteria) -> int:
+        with self.transaction():
+            removed = self.find(collection, **criteria)
+            if not removed:
+                return 0
+
+            txn = self._txn.current
+            txn.ops.append((collection, DeleteMany(criteria)))
+            if collection in REVISIONED:
+                txn.guarded[collection] = txn.guarded.get(collection, 0) + len(removed)
+            for old in removed:
+                key = self.key(collection, old)
+                txn.overlay[(collection, key)] = _DELETED
+                txn.changes.append((collection, old, None))
+                self._tombstone(collection, key, old)
+        return len(removed)
+
+    # ---------------- COORDINATION ----------------
+
+    def lease(self, name: str, owner: str, seconds: float) -> bool:
+        now = time.time()
+        try:
+            self.mongo["leases"].find_one_and_update(
+                {"_id": name, "$or": [{"owner": owner}, {"expires": {"$lt": now}}]},
+                {"$set": {"owner": owner, "expires": now + seconds}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            return False  # held by someone else
+        return True
+
+    # ---------------- ASYNC ACCESS ----------------
+
+    async def aread(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(fn, *args, **kwargs)
+        )
+
+    awrite = aread
+
+    # ---------------- CHANGE FEED ----------------
+
+    def subscribe(self, collection: str, listener):
+        with self._listener_lock:
+            self._listeners.setdefault(collection, []).append(listener)
+            for record in self.all(collection):
+                listener(None, record)
@@ -0,0 +1,269 @@
+import heapq
+import logging
+import os
+import socket
+import threading
+from datetime import date, datetime, timedelta
+
+from storage import db
+from utils import calculate_priority
+from activity_utils import log_activity
+from notifications_utils import create_notification
+from events import task_event
+from core.config import SCHEDULER_POLL_INTERVAL
+
+# =========================================================
+# DUE-DATE SCHEDULER
+# =========================================================
+# A task's smart priority and reminders only change on four days around
+# its due date: two days before (medium), the day before (due-tomorrow
+# reminder), the day itself (high) and the day after (overdue reminder).
+# Priority is only moved while it is automatic: "auto_priority" holds the
+# level last derived from the due date, and a task whose priority was set
+# by hand (auto_priority None) keeps it.
+# Each open task sits in a min-heap keyed by the next of those days (or
+# today, if it is not settled for today yet). Every tick pops the tasks
+# whose day has come: their priority is stored, reminders are created
+# once (the task records which due date it was reminded about) and the
+# change is logged.
+#
+# The scheduler also keeps the sets of open tasks that are due tomorrow
+# or overdue, so the notification feed needs no date math per request.
+# _feed_version counts changes to those sets, for the feed's ETag.
+#
+# On a shared store (MongoDB) other workers write tasks too. There only
+# the worker holding the "due-scheduler" lease ticks, and it catches up
+# on every task written since its last tick through db.changes() instead
+# of subscribe(); the notification feed queries due dates directly, one
+# query per list.
+
+_lock = threading.Lock()
+_heap: list[tuple[str, str, int]] = []   # (event day, due date, task id)
+_today = date.today()
+_due_tomorrow: set[int] = set()
+_overdue: set[int] = set()
+_feed_version = 0
+_synced_rev: int | None = None   # shared stores: tasks revision tracked up to
+_owner = f"{socket.gethostname()}:{os.getpid()}"
+
+logger = logging.getLogger(__name__)
+
+def _parse(due_date_str):
+    try:
+        return datetime.strptime(due_date_str, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        return None
+
+def _is_open(task) -> bool:
+    return task is not None and task.get("status") != "completed"
+
+def _pending_changes(task, due: date, today: date) -> dict:
+    changes = {}
+
+    if task.get("auto_priority") is not None:
+        priority = calculate_priority(task["due_date"], today)
+        if priority != task["auto_priority"]:
+            changes["priority"] = priority
+            changes["auto_priority"] = priority
+    if due == today + timedelta(days=1) and task.get("due_soon_notified") != task["due_date"]:
+        changes["due_soon_notified"] = task["due_date"]
+    if due < today and task.get("overdue_notified") != task["due_date"]:
+        changes["overdue_notified"] = task["due_date"]
+
+    return changes
+
+def _next_event(task, due: date, today: date) -> date | None:
+    if _pending_changes(task, due, today):
+        return today
+    for offset in (-2, -1, 0, 1):
+        day = due + timedelta(days=offset)
+        if day > today:
+            return day
+    return None
+
+def _track(task_id, task):
+    # Caller holds _lock
+    global _feed_version
+    before = (task_id in _due_tomorrow, task_id in _overdue)
+    _due_tomorrow.discard(task_id)
+    _overdue.discard(task_id)
+
+    due = _parse(task.get("due_date")) if _is_open(task) else None
+
+    if due is not None and due == _today + timedelta(days=1):
+        _due_tomorrow.add(task_id)
+    elif due is not None and due < _today:
+        _overdue.add(task_id)
+
+    if before != (task_id in _due_tomorrow, task_id in _overdue):
+        _feed_version += 1
+    if due is None:
+        return
+
+    event = _next_event(task, due, _today)
+    if event is not None:
+        heapq.heappush(_heap, (event.isoformat(), task["due_date"], task_id))
+
+def _on_task_change(old, new):
+    with _lock:
+        _track((new or old)["id"], new)
+
+if not db.shared:
+    db.subscribe("tasks", _on_task_change)
+
+def _sync():
+    # Shared stores: track every task written since the last sync, by any
+    # worker; start over from a full read the first time
+    global _synced_rev
+    delta = db.changes("tasks", _synced_rev) if _synced_rev is not None else None
+
+    if delta is None:
+        rev = db.revision("tasks")
+        tasks = db.all("tasks")
+        with _lock:
+            _heap.clear()
+            _due_tomorrow.clear()
+            _overdue.clear()
+            for task in tasks:
+                _track(task["id"], task)
+        _synced_rev = rev
+        return
+
+    with _lock:
+        for task in delta["upserts"]:
+            _track(task["id"], task)
+        for tombstone in delta["deleted"]:
+            if not tombstone.get("moved"):
+                _track(tombstone["key"], None)
+    _synced_rev = delta["rev"]
+
+
+# Open tasks due tomorrow / overdue, by id, optionally only those
+# assigned to one user
+
+def _select(tasks, assigned_to=None, before: str | None = None) -> list[dict]:
+    return sorted((
+        t for t in tasks
+        if _is_open(t) and _parse(t.get("due_date"))
+        and (assigned_to is None or t["assigned_to"] == assigned_to)
+        and (before is None or t["due_date"] < before)
+    ), key=lambda t: t["id"])
+
+def _tracked(ids: set[int], assigned_to=None) -> list[dict]:
+    with _lock:
+        ids = set(ids)
+    return _select((db.get("tasks", i) for i in ids), assigned_to)
+
+def due_tomorrow_tasks(assigned_to=None) -> list[dict]:
+    if db.shared:
+        criteria = {"due_date": (date.today() + timedelta(days=1)).isoformat()}
+        if assigned_to is not None:
+            criteria["assigned_to"] = assigned_to
+        return _select(db.find("tasks", **criteria))
+    return _tracked(_due_tomorrow, assigned_to)
+
+def overdue_tasks(assigned_to=None) -> list[dict]:
+    if db.shared:
+        today = date.today().isoformat()
+        if assigned_to is not None:
+            return _select(db.find("tasks", assigned_to=assigned_to), before=today)
+        return _select(db.range("tasks", "due_date", None, today))
+    return _tracked(_overdue, assigned_to)
+
+def feed_version():
+    # Shared stores build the feed per request, so it only moves with the
+    # tasks themselves and the date
+    if db.shared:
+        return date.today().isoformat()
+    return _feed_version
+
+
+# ---------------- TICK ----------------
+
+def _apply_changes(task, changes: dict):
+    if "priority" in changes:
+        log_activity(
+            task["id"],
+            None,
+            f"Priority changed from {task.get('priority')} to {changes['priority']} (due {task['due_date']})"
+        )
+
+    if "due_soon_notified" in changes:
+        create_notification(
+            task["assigned_to"],
+            task["id"],
+            f"⏰ Task '{task['title']}' is due tomorrow"
+        )
+
+    if "overdue_notified" in changes:
+        create_notification(
+            task["assigned_to"],
+            task["id"],
+            f"⚠️ Task '{task['title']}' is overdue"
+        )
+
+    updated = db.update("tasks", task["id"], changes)
+    if "priority" in changes:
+        task_event("task.updated", updated, task)
+
+def tick(today: date | None = None):
+    global _today
+    today = today or date.today()
+
+    if db.shared:
+        if not db.lease("due-scheduler", _owner, SCHEDULER_POLL_INTERVAL * 3):
+            return
+        _sync()
+
+    with _lock:
+        if today != _today:
+            _today = today
+        due = set()
+        while _heap and _heap[0][0] <= today.isoformat():
+            _, due_date, task_id = heapq.heappop(_heap)
+            due.add((task_id, due_date))
+
+    if not due:
+        return
+
+    try:
+        with db.transaction():
+            for task_id, due_date in sorted(due):
+                task = db.get("tasks", task_id)
+                # Skip heap entries left behind by later edits
+                if not _is_open(task) or task["due_date"] != due_date:
+                    continue
+
+                changes = _pending_changes(task, _parse(due_date), today)
+                if changes:
+                    # The update re-tracks the task through the listener
+                    # (or the next _sync() on a shared store)
+                    _apply_changes(task, changes)
+                else:
+                    with _lock:
+                        _track(task_id, task)
+    except Exception:
+        # Nothing was applied: retry these on the next tick
+        with _lock:
+            for task_id, due_date in due:
+                heapq.heappush(_heap, (today.isoformat(), due_date, task_id))
+        raise
+
+_stop = threading.Event()
+
+def start():
+    def run():
+        while True:
+            try:
+                tick()
+            except Exception:
+                # Keep the thread alive; tick() requeued what it popped
+                logger.exception("due-date scheduler tick failed")
+            if _stop.wait(SCHEDULER_POLL_INTERVAL):
+                return
+
+    _stop.clear()
+    threading.Thread(target=run, name="due-scheduler", daemon=True).start()
+
+def stop():
+    _stop.set()
@@ -0,0 +1,34 @@
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query
+from auth_utils import decode_token
+from events import hub
+
+router = APIRouter(prefix="/events", tags=["Events"])
+
+# ================= WEBSOCKET: TASK & NOTIFICATION EVENTS =================
+# Messages: {"id", "type", "data"} with type task.created / task.updated /
+# task.deleted / notification.created, then {"type": "ready", "id"} once
+# caught up. {"type": "reset"} means events were missed: reload.
+
+@router.websocket("/ws")
+async def websocket_events(
+    websocket: WebSocket,
+    token: str = Query(...),
+    last_event_id: str | None = Query(None)
+):
+    await websocket.accept()
+
+    payload = decode_token(token)
+    if not payload:
+        await websocket.close()
+        return
+
+    conn = hub.connect(payload["user_id"], payload["role"], websocket, last_event_id)
+
+    try:
+        while True:
+            # Nothing to receive; this just notices the disconnect
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        hub.disconnect(conn)
@@ -0,0 +1,213 @@
+import asyncio
+import json
+import os
+from collections import deque
+
+from fastapi import WebSocket
+
+from storage import db
+from pubsub import Broker, create_broker
+from core.config import EVENT_BUFFER_SIZE, WS_SEND_QUEUE_SIZE, WS_SEND_TIMEOUT
+
+
+# =========================================================
+# USER EVENTS
+# =========================================================
+# Task and notification changes are pushed over /events/ws instead of
+# being polled. emit() is called next to log_activity() and
+# create_notification(); the event is published once the surrounding
+# transaction commits, through the pub/sub broker so every worker gets it.
+#
+# Each worker numbers the events it receives ("<epoch>.<n>", the epoch
+# changing on restart) and keeps the last EVENT_BUFFER_SIZE of them. A
+# client reconnecting with last_event_id is sent what it missed, or a
+# "reset" when that is no longer buffered, and then reloads. A client that
+# can't keep up is disconnected and resumes the same way.
+
+CHANNEL = "events"
+
+
+class EventConnection:
+    def __init__(self, user_id: int, role: str, websocket: WebSocket):
+        self.user_id = user_id
+        self.role = role
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=WS_SEND_QUEUE_SIZE)
+        self.sender: asyncio.Task | None = None
+
+    def wants(self, event: dict) -> bool:
+        if self.user_id in event["users"]:
+            return True
+        return event["admins"] and self.role == "admin"
+
+
+class EventHub:
+    def __init__(self, broker: Broker):
+        self.broker = broker
+        self.epoch = os.urandom(4).hex()
+        self.seq = 0
+        self.buffer: deque = deque(maxlen=EVENT_BUFFER_SIZE)  # (seq, event, text)
+        self.connections: set[EventConnection] = set()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        # Publishes and socket closes in flight; the loop only keeps weak
+        # references to tasks
+        self._tasks: set[asyncio.Task] = set()
+
+    async def start(self):
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+            await self.broker.start(self._on_publish)
+
+    async def stop(self):
+        if self._loop is not None:
+            self._loop = None
+            await self.broker.stop()
+
+    def last_event_id(self) -> str:
+        return f"{self.epoch}.{self.seq}"
+
+    # ---------------- PUBLISHING ----------------
+
+    def emit(self, kind: str, data: dict, users, admins: bool = True):
+        # Safe from any thread; nothing is sent if the transaction fails
+        event = {
+            "type": kind,
+            "data": data,
+            "users": sorted({u for u in users if u is not None}),
+            "admins": admins
+        }
+        db.after_commit(lambda: self._publish_threadsafe(event))
+
+    def _publish_threadsafe(self, event: dict):
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return  # not serving (scripts, tests without the lifespan)
+
+        text = json.dumps(event)
+        loop.call_soon_threadsafe(
+            lambda: self._spawn(self.broker.publish(CHANNEL, text))
+        )
+
+    def _spawn(self, coro):
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _on_publish(self, channel: str, text: str):
+        if channel != CHANNEL:
+            return
+
+        event = json.loads(text)
+        self.seq += 1
+        entry = (self.seq, event, json.dumps({
+            "id": self.last_event_id(),
+            "type": event["type"],
+            "data": event["data"]
+        }))
+        self.buffer.append(entry)
+
+        for conn in list(self.connections):
+            if not conn.wants(event):
+                continue
+            try:
+                conn.queue.put_nowait(entry[2])
+            except asyncio.QueueFull:
+                self._evict(conn)
+
+    # ---------------- CONNECTIONS ----------------
+
+    def _missed(self, conn: EventConnection, last_event_id: str | None) -> list[str] | None:
+        # Events after last_event_id for this user; None if we can't tell
+        if last_event_id is None:
+            return []
+
+        epoch, _, seq = last_event_id.partition(".")
+        if epoch != self.epoch or not seq.isdigit() or int(seq) > self.seq:
+            return None
+
+        oldest = self.buffer[0][0] if self.buffer else self.seq + 1
+        if int(seq) < oldest - 1:
+            return None
+
+        return [
+            text for n, event, text in self.buffer
+            if n > int(seq) and conn.wants(event)
+        ]
+
+    def connect(self, user_id: int, role: str, websocket: WebSocket,
+                last_event_id: str | None = None) -> EventConnection:
+        # No await in here: no event can slip in between the backlog and
+        # the connection going live
+        conn = EventConnection(user_id, role, websocket)
+        missed = self._missed(conn, last_event_id)
+
+        if missed is None or len(missed) >= WS_SEND_QUEUE_SIZE:
+            missed = [json.dumps({"type": "reset"})]
+        missed.append(json.dumps({"type": "ready", "id": self.last_event_id()}))
+
+        for text in missed:
+            conn.queue.put_nowait(text)
+
+        conn.sender = asyncio.create_task(self._send_loop(conn))
+        self.connections.add(conn)
+        return conn
+
+    def disconnect(self, conn: EventConnection):
+        self.connections.discard(conn)
+        if conn.sender and conn.sender is not asyncio.current_task():
+            conn.sender.cancel()
+
+    async def _send_loop(self, conn: EventConnection):
+        try:
+            while True:
+                text = await conn.queue.get()
+                await asyncio.wait_for(conn.websocket.send_text(text), WS_SEND_TIMEOUT)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self._evict(conn)
+
+    def _evict(self, conn: EventConnection):
+        # Out of the fan-out at once; a stalled client can hold up the
+        # close handshake, so that runs on its own
+        self.disconnect(conn)
+        self._spawn(self._close(conn.websocket))
+
+    @staticmethod
+    async def _close(websocket: WebSocket):
+        try:
+            await asyncio.wait_for(websocket.close(), WS_SEND_TIMEOUT)
+        except Exception:
+            pass
+
+
+hub = EventHub(create_broker())
+
+
+# ---------------- EVENT HELPERS ----------------
+# Task events carry the whole task, so they only go to those allowed to
+# read it: admins and the current assignee. A task's previous assignee
+# just gets its id in a "task.deleted" marked "moved", the same way
+# /tasks/changes reports a reassignment. Notification events only go to
+# their recipient.
+
+def task_event(kind: str, task: dict, old: dict | None = None):
+    hub.emit(kind, task, {task.get("assigned_to")})
+
+    moved_from = old.get("assigned_to") if old is not None else None
+    if moved_from is not None and moved_from != task.get("assigned_to"):
+        hub.emit(
+            "task.deleted", {"id": task["id"], "moved": True},
+            {moved_from}, admins=False
+        )
+
+
+def task_deleted_event(task: dict):
+    hub.emit("task.deleted", {"id": task["id"]}, {task.get("assigned_to")})
+
+
+def notification_event(notification: dict):
+    hub.emit(
+        "notification.created", notification,
+        {notification["user_id"]}, admins=False
+    )
@@ -1,29 +1,52 @@
-from fastapi import APIRouter, Depends, HTTPException
-from json_db import load_db, save_db
+from fastapi import APIRouter, Depends, HTTPException, Header
+from pydantic import BaseModel
+from storage import db
 from role_utils import get_payload
+from membership_utils import group_ids_for, add_members, remove_group_members
+from responses import (
+    FastJSONResponse, list_etag, etag_matches, cache_headers, not_modified
+)
 
 router = APIRouter(prefix="/groups", tags=["Groups"])
 
 
+class GroupOut(BaseModel):
+    id: int
+    name: str
+    created_by: int | None = None
+
+
 # -------------------------------------------------
 # GET GROUPS (Admin → all, User → only joined)
 # -------------------------------------------------
-@router.get("/")
-def get_groups(payload: dict = Depends(get_payload)):
-    db = load_db()
+@router.get("/", response_model=list[GroupOut])
+async def get_groups(
+    if_none_match: str | None = Header(None),
+    payload: dict = Depends(get_payload)
+):
     user_id = payload["user_id"]
     role = payload["role"]
 
+    version = await db.aread(db.version, "groups", "group_members")
+    tag = list_etag(user_id, role, version)
+    if etag_matches(if_none_match, tag):
+        return not_modified(tag)
+
+    if role == "admin":
+        groups = await db.aread(db.all, "groups")
+    else:
+        groups = await db.aread(_joined_groups, user_id)
+
+    return FastJSONResponse(groups, headers=cache_headers(tag))
+
+
+def _joined_groups(user_id: int) -> list[dict]:
     groups = []
 
-    for group in db["groups"]:
-        if role == "admin":
+    for group_id in group_ids_for(user_id):
+        group = db.get("groups", group_id)
+        if group:
             groups.append(group)
-        else:
-            for gm in db["group_members"]:
-                if gm["group_id"] == group["id"] and gm["user_id"] == user_id:
-                    groups.append(group)
-                    break
 
     return groups
 
@@ -32,81 +55,58 @@ def get_groups(payload: dict = Depends(get_payload)):
 # CREATE GROUP (ADMIN ONLY)
 # -------------------------------------------------
 @router.post("/")
-def create_group(data: dict, payload: dict = Depends(get_payload)):
-    db = load_db()
-
+async def create_group(data: dict, payload: dict = Depends(get_payload)):
     role = payload["role"]
     creator_id = payload["user_id"]
 
     if role != "admin":
         raise HTTPException(status_code=403, detail="Only admin can create groups")
 
-    db.setdefault("groups", [])
-    db.setdefault("group_members", [])
-
     name = data.get("name")
     members = data.get("members", [])
 
-    if not name:
+    if not name or not isinstance(name, str):
         raise HTTPException(status_code=400, detail="Group name required")
 
-    group_id = len(db["groups"]) + 1
-    new_group = {
-        "id": group_id,
-        "name": name,
-        "created_by": creator_id
-    }
-
-    db["groups"].append(new_group)
-
-    # Add creator
-    db["group_members"].append({
-        "group_id": group_id,
-        "user_id": creator_id
-    })
-
-    # Add selected members safely
-    for user_id in set(members):
-        if user_id != creator_id:
-            db["group_members"].append({
-                "group_id": group_id,
-                "user_id": user_id
-            })
-
-    save_db(db)
+    return await db.awrite(_insert_group, name, creator_id, members)
+
+
+def _insert_group(name: str, creator_id: int, members: list) -> dict:
+    with db.transaction():
+        new_group = db.insert("groups", {
+            "name": name,
+            "created_by": creator_id
+        })
+        group_id = new_group["id"]
+
+        # Add creator, then selected members safely
+        add_members(group_id, [creator_id, *set(members)])
+
     return new_group
 
 
 @router.delete("/{group_id}")
-def delete_group(
+async def delete_group(
     group_id: int,
     payload: dict = Depends(get_payload)
 ):
-    db = load_db()
-
     # 🔐 Admin only
     if payload.get("role") != "admin":
         raise HTTPException(status_code=403, detail="Admins only")
 
-    # Remove group
-    db["groups"] = [
-        g for g in db.get("groups", [])
-        if g["id"] != group_id
-    ]
-
-    # Remove group members
-    db["group_members"] = [
-        gm for gm in db.get("group_members", [])
-        if gm["group_id"] != group_id
-    ]
-
-    # Remove messages
-    db["messages"] = [
-        m for m in db.get("messages", [])
-        if m["group_id"] != group_id
-    ]
-
-    save_db(db)
+    await db.awrite(_delete_group, group_id)
     return {"message": "Group deleted successfully"}
 
 
+def _delete_group(group_id: int):
+    with db.transaction():
+        # Remove group
+        db.delete("groups", group_id)
+
+        # Remove group members
+        remove_group_members(group_id)
+
+        # Remove messages
+        db.delete_where("messages", group_id=group_id)
+
+
@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import user_routes,task_routes
@@ -6,15 +7,40 @@ from fastapi.openapi.utils import get_openapi
 from activity_routes import router as activity_router
 from notification_routes import router as notification_router
 from group_routes import router as group_router
-from chat_routes import router as chat_router
-from fastapi.staticfiles import StaticFiles
-
-
-
-
+from chat_routes import router as chat_router, manager as chat_manager
+from event_routes import router as event_router
+from search_routes import router as search_router
+from events import hub as event_hub
+from static_files import UploadsStaticFiles
+from compression import CompressionMiddleware
+from chat_pipeline import message_writer
+from auth_utils import shutdown_password_pool
+from storage import db
+import due_scheduler
+import activity_archive
+
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    db.load()
+    await chat_manager.start()
+    await event_hub.start()
+    due_scheduler.start()
+    activity_archive.start()
+    yield
+    due_scheduler.stop()
+    activity_archive.stop()
+    # Flush chat messages still waiting in the write queue
+    await message_writer.stop()
+    await chat_manager.stop()
+    await event_hub.stop()
+    shutdown_password_pool()
+    db.close()
 
 
 app = FastAPI(
+    lifespan=lifespan,
     title="Task Manager API",
     version="1.0.0",
     openapi_url="/openapi.json",
@@ -38,6 +64,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(CompressionMiddleware)
 
 
 app.include_router(user_routes.router)
@@ -46,8 +73,10 @@ app.include_router(activity_router)
 app.include_router(notification_router)
 app.include_router(group_router)
 app.include_router(chat_router)
+app.include_router(event_router)
+app.include_router(search_router)
 
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+app.mount("/uploads", UploadsStaticFiles(directory="uploads"), name="uploads")
 
 def custom_openapi():
     if app.openapi_schema:
@@ -79,5 +108,5 @@ app.openapi = custom_openapi
 
 
 @app.get("/")
-def home():
+async def home():
     return {"message": "Backend Running Successfully!"}
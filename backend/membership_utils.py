@@ -0,0 +1,26 @@
+from storage import db
+
+# Group membership lives in db["group_members"], indexed both ways
+# (group -> members, user -> groups). Every permission check for groups
+# and chat goes through here.
+
+def is_member(group_id, user_id) -> bool:
+    return db.get("group_members", (group_id, user_id)) is not None
+
+def member_ids(group_id) -> list[int]:
+    return [gm["user_id"] for gm in db.find("group_members", group_id=group_id)]
+
+def group_ids_for(user_id) -> list[int]:
+    return [gm["group_id"] for gm in db.find("group_members", user_id=user_id)]
+
+def add_members(group_id, user_ids):
+    with db.transaction():
+        for user_id in user_ids:
+            if not is_member(group_id, user_id):
+                db.insert("group_members", {
+                    "group_id": group_id,
+                    "user_id": user_id
+                })
+
+def remove_group_members(group_id) -> int:
+    return db.delete_where("group_members", group_id=group_id)
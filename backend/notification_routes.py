@@ -1,63 +1,100 @@
-from fastapi import APIRouter, Depends
-from datetime import datetime, timedelta
-from json_db import load_db
+from fastapi import APIRouter, Depends, HTTPException, Query, Header, Response
+from storage import db
 from role_utils import get_payload
+from due_scheduler import due_tomorrow_tasks, overdue_tasks, feed_version
+from responses import list_etag, etag_matches, cache_headers, not_modified
+from notifications_utils import (
+    unread_count, get_inbox, mark_read, mark_all_read
+)
 
 router = APIRouter(prefix="/notifications", tags=["Notifications"])
 
 @router.get("/")
-def get_notifications(payload: dict = Depends(get_payload)):
-    db = load_db()
+async def get_notifications(
+    response: Response,
+    if_none_match: str | None = Header(None),
+    payload: dict = Depends(get_payload)
+):
     user_id = payload["user_id"]
     role = payload["role"]
 
-    today = datetime.utcnow().date()
-    tomorrow = today + timedelta(days=1)
+    # Built from tasks and the scheduler's due-tomorrow/overdue sets
+    version = await db.aread(db.version, "tasks")
+    tag = list_etag(user_id, role, version, feed_version())
+    if etag_matches(if_none_match, tag):
+        return not_modified(tag)
+
+    response.headers.update(cache_headers(tag))
+    return await db.aread(_task_notifications, user_id, role)
+
+
+def _task_notifications(user_id: int, role: str) -> list[dict]:
+    # User sees only assigned tasks
+    assignee = user_id if role == "user" else None
+
+    def entry(kind, task):
+        return {
+            "type": kind,
+            "title": task["title"],
+            "priority": task["priority"],
+            "status": task["status"],
+            "due_date": task["due_date"]
+        }
 
     notifications = []
 
-    for task in db["tasks"]:
-
-        # User sees only assigned tasks
-        if role == "user" and task["assigned_to"] != user_id:
-            continue
-
-        # 🔴 HIGH PRIORITY + PENDING
-        if task["priority"] == "high" and task["status"] == "pending":
-            notifications.append({
-                "type": "high_priority",
-                "title": task["title"],
-                "priority": task["priority"],
-                "status": task["status"],
-                "due_date": task["due_date"]
-            })
-
-        if not task["due_date"] or task["status"] == "completed":
-            continue
-
-        due_date = datetime.strptime(task["due_date"], "%Y-%m-%d").date()
-
-        # ⏰ DUE TOMORROW
-        if due_date == tomorrow:
-            notifications.append({
-                "type": "due_tomorrow",
-                "title": task["title"],
-                "priority": task["priority"],
-                "status": task["status"],
-                "due_date": task["due_date"]
-            })
-
-        # ⚠️ OVERDUE
-        if due_date < today:
-            notifications.append({
-                "type": "overdue",
-                "title": task["title"],
-                "priority": task["priority"],
-                "status": task["status"],
-                "due_date": task["due_date"]
-            })
+    # 🔴 HIGH PRIORITY + PENDING
+    criteria = {"status": "pending", "priority": "high"}
+    if assignee is not None:
+        criteria["assigned_to"] = assignee
+
+    for task in db.find("tasks", **criteria):
+        notifications.append(entry("high_priority", task))
+
+    # ⏰ DUE TOMORROW / ⚠️ OVERDUE — tracked by the due-date scheduler
+    for kind, tasks in (
+        ("due_tomorrow", due_tomorrow_tasks(assignee)),
+        ("overdue", overdue_tasks(assignee)),
+    ):
+        for task in tasks:
+            notifications.append(entry(kind, task))
 
     return notifications
 
-        
-        
+
+# -------------------------------------------------
+# INBOX (stored notifications, newest first)
+# -------------------------------------------------
+@router.get("/inbox")
+async def get_notification_inbox(
+    before: int | None = Query(None, description="Return notifications older than this id"),
+    limit: int = Query(20, ge=1, le=100),
+    payload: dict = Depends(get_payload)
+):
+    user_id = payload["user_id"]
+    items = await db.aread(get_inbox, user_id, before=before, limit=limit)
+
+    return {
+        "notifications": items,
+        "unread_count": await db.aread(unread_count, user_id),
+        "next_before": items[-1]["id"] if len(items) == limit else None
+    }
+
+
+@router.get("/unread-count")
+async def get_unread_count(payload: dict = Depends(get_payload)):
+    return {"unread_count": await db.aread(unread_count, payload["user_id"])}
+
+
+@router.post("/read-all")
+async def read_all_notifications(payload: dict = Depends(get_payload)):
+    return {"updated": await db.awrite(mark_all_read, payload["user_id"])}
+
+
+@router.post("/{notification_id}/read")
+async def read_notification(notification_id: int, payload: dict = Depends(get_payload)):
+    n = await db.awrite(mark_read, payload["user_id"], notification_id)
+    if not n:
+        raise HTTPException(status_code=404, detail="Notification not found")
+
+    return n
@@ -1,13 +1,70 @@
+import threading
 from datetime import datetime
+from storage import db
+from events import notification_event
 
-def create_notification(db, user_id, task_id, message):
-    db["notifications"].append({
-        "id": len(db["notifications"]) + 1,
+def create_notification(user_id, task_id, message):
+    notification = db.insert("notifications", {
         "user_id": user_id,
         "task_id": task_id,
         "message": message,
         "created_at": datetime.now().isoformat(),
         "read": False
     })
-   
+    notification_event(notification)
+    return notification
 
+# ---------------- UNREAD TRACKING ----------------
+# Unread notification ids per user, kept in step with the storage engine
+# so the badge count is a len() and mark-all-read only touches unread rows.
+# A shared store (MongoDB) answers both from its (user_id, read) index.
+
+_unread_lock = threading.Lock()
+_unread: dict[int, set[int]] = {}
+
+def _on_notification_change(old, new):
+    with _unread_lock:
+        if old is not None and not old.get("read"):
+            ids = _unread.get(old["user_id"])
+            if ids is not None:
+                ids.discard(old["id"])
+                if not ids:
+                    del _unread[old["user_id"]]
+        if new is not None and not new.get("read"):
+            _unread.setdefault(new["user_id"], set()).add(new["id"])
+
+if not db.shared:
+    db.subscribe("notifications", _on_notification_change)
+
+def _unread_ids(user_id) -> list[int]:
+    if db.shared:
+        return [n["id"] for n in db.find("notifications", user_id=user_id, read=False)]
+    with _unread_lock:
+        return list(_unread.get(user_id, ()))
+
+def unread_count(user_id) -> int:
+    if db.shared:
+        return db.count("notifications", user_id=user_id, read=False)
+    with _unread_lock:
+        return len(_unread.get(user_id, ()))
+
+def get_inbox(user_id, before=None, limit=20) -> list[dict]:
+    # Newest first
+    page = db.page("notifications", "user_id", user_id, before=before, limit=limit)
+    return page[::-1]
+
+def mark_read(user_id, notification_id) -> dict | None:
+    with db.transaction():
+        n = db.get("notifications", notification_id)
+        if not n or n["user_id"] != user_id:
+            return None
+        if n.get("read"):
+            return n
+        return db.update("notifications", notification_id, {"read": True})
+
+def mark_all_read(user_id) -> int:
+    with db.transaction():
+        ids = _unread_ids(user_id)
+        for notification_id in ids:
+            db.update("notifications", notification_id, {"read": True})
+    return len(ids)
@@ -0,0 +1,173 @@
+import asyncio
+import fcntl
+import json
+import os
+
+from core.config import PUBSUB_BACKEND, PUBSUB_SOCKET
+
+
+# =========================================================
+# PUB/SUB BACKENDS
+# =========================================================
+# ConnectionManager publishes every chat payload here and delivers what
+# comes back to its own sockets, so users connected to different uvicorn
+# workers still see each other's messages.
+#
+# A backend implements Broker:
+#   start(on_message)       connect; on_message(channel, data) is awaited
+#                           for every message published by any process,
+#                           including this one
+#   publish(channel, data)  send a serialized (str) message
+#   stop()                  disconnect
+#
+# External brokers plug in the same way. For Redis, start() would
+# SUBSCRIBE to "chat:*" and forward each message to on_message, and
+# publish() would be PUBLISH channel data. Delivery is at-most-once:
+# chat history is what guarantees nothing is lost.
+
+class Broker:
+    async def start(self, on_message):
+        raise NotImplementedError
+
+    async def publish(self, channel: str, data: str):
+        raise NotImplementedError
+
+    async def stop(self):
+        pass
+
+
+class LocalBroker(Broker):
+    # Single process: publishing is just delivering
+    async def start(self, on_message):
+        self._on_message = on_message
+
+    async def publish(self, channel: str, data: str):
+        await self._on_message(channel, data)
+
+
+class UnixSocketBroker(Broker):
+    # Every worker is a client of one relay listening on a Unix socket.
+    # Whichever worker finds no live relay starts one (under a file lock,
+    # so exactly one wins); if that worker dies, the others reconnect and
+    # elect a new relay. Messages are newline-delimited JSON.
+
+    MAX_CLIENT_BUFFER = 4 * 1024 * 1024
+
+    def __init__(self, path: str):
+        self.path = path
+        self._server: asyncio.AbstractServer | None = None
+        self._clients: set[asyncio.StreamWriter] = set()
+        self._writer: asyncio.StreamWriter | None = None
+        self._reader_task: asyncio.Task | None = None
+        self._stopping = False
+
+    async def start(self, on_message):
+        self._on_message = on_message
+        await self._connect()
+        self._reader_task = asyncio.create_task(self._read_loop())
+
+    async def publish(self, channel: str, data: str):
+        if self._writer is None:
+            return
+        line = json.dumps({"ch": channel, "d": data}) + "\n"
+        self._writer.write(line.encode())
+        await self._writer.drain()
+
+    async def stop(self):
+        self._stopping = True
+        if self._reader_task:
+            self._reader_task.cancel()
+        if self._writer:
+            self._writer.close()
+        if self._server:
+            self._server.close()
+            for client in list(self._clients):
+                client.close()
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+
+    # ---------------- CLIENT ----------------
+
+    async def _connect(self):
+        lock = await asyncio.to_thread(self._acquire_election_lock)
+        try:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path)
+            except (FileNotFoundError, ConnectionRefusedError):
+                # No live relay: remove a stale socket and become it
+                try:
+                    os.unlink(self.path)
+                except FileNotFoundError:
+                    pass
+                self._server = await asyncio.start_unix_server(
+                    self._serve_client, path=self.path
+                )
+                reader, writer = await asyncio.open_unix_connection(self.path)
+        finally:
+            lock.close()
+
+        self._reader, self._writer = reader, writer
+
+    async def _reconnect(self):
+        while not self._stopping:
+            await asyncio.sleep(0.5)
+            try:
+                await self._connect()
+                return
+            except OSError:
+                continue
+
+    def _acquire_election_lock(self):
+        lock = open(self.path + ".lock", "w")
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        return lock
+
+    async def _read_loop(self):
+        while not self._stopping:
+            try:
+                line = await self._reader.readline()
+            except ConnectionError:
+                line = b""
+
+            if not line:
+                # Relay went away; elect a new one and carry on
+                self._writer = None
+                await self._reconnect()
+                continue
+
+            try:
+                msg = json.loads(line)
+            except ValueError:
+                continue
+            await self._on_message(msg["ch"], msg["d"])
+
+    # ---------------- RELAY ----------------
+
+    async def _serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._clients.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                for client in list(self._clients):
+                    # A worker that stops reading is cut off rather than
+                    # letting its buffer grow without bound
+                    if client.transport.get_write_buffer_size() > self.MAX_CLIENT_BUFFER:
+                        self._clients.discard(client)
+                        client.close()
+                        continue
+                    client.write(line)
+        except ConnectionError:
+            pass
+        finally:
+            self._clients.discard(writer)
+            writer.close()
+
+
+def create_broker() -> Broker:
+    if PUBSUB_BACKEND == "unix":
+        return UnixSocketBroker(PUBSUB_SOCKET)
+    return LocalBroker()
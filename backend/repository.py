@@ -0,0 +1,234 @@
+import asyncio
+import re
+from collections import Counter
+from datetime import datetime
+
+COLLECTIONS = (
+    "users",
+    "tasks",
+    "activity_logs",
+    "notifications",
+    "groups",
+    "group_members",
+    "messages",
+)
+
+# Collections without an "id" are keyed by a composite of their fields
+PRIMARY_KEYS = {
+    "group_members": ("group_id", "user_id"),
+}
+
+# Records in these collections carry "rev", a per-collection revision
+# bumped by every insert, update and delete, and "updated_at", so
+# clients can sync them by delta through changes()
+REVISIONED = ("tasks",)
+
+# Fields of a deleted record kept with its tombstone, so a delta can be
+# narrowed to the deletions that concern one client. A record whose
+# value for one of them changes leaves a "moved" tombstone as well.
+TOMBSTONE_FIELDS = {
+    "tasks": ("assigned_to",),
+}
+
+
+class VersionConflict(Exception):
+    # update()/delete() with expected_rev found the record at another
+    # revision: someone else wrote it first
+    def __init__(self, collection: str, key):
+        super().__init__(f"{collection} {key!r} was modified concurrently")
+        self.collection = collection
+        self.key = key
+
+
+# =========================================================
+# STORAGE INTERFACE
+# =========================================================
+# Route modules and utils only talk to `storage.db`, which is one of the
+# backends below. Records are plain dicts; a record's key is its "id",
+# or a tuple of the PRIMARY_KEYS fields. Returned records must be treated
+# as read-only: change them through update().
+#
+#   json_db.JsonDB     in-memory tables, append-only log, data.json
+#   database.MongoDB   MongoDB with pooled connections and bulk writes
+#
+# Handlers are async and never call a blocking backend directly: reads go
+# through `await db.aread(fn, ...)` and write blocks - usually a function
+# wrapping `with db.transaction()` - through `await db.awrite(fn, ...)`.
+# Each backend decides where that work runs.
+#
+# `shared` backends are written by several processes at once. State a
+# module derives from subscribe() would only see this process's writes
+# there, so those modules ask the store instead (count, count_by,
+# match_words, changes) and run singleton jobs under a lease().
+
+class Repository:
+
+    shared = False
+
+    # ---------------- LIFECYCLE ----------------
+
+    def load(self):
+        pass
+
+    def close(self):
+        pass
+
+    def key(self, collection: str, record: dict):
+        fields = PRIMARY_KEYS.get(collection, ("id",))
+        if len(fields) == 1:
+            return record[fields[0]]
+        return tuple(record[f] for f in fields)
+
+    # ---------------- READS ----------------
+
+    def get(self, collection: str, key) -> dict | None:
+        raise NotImplementedError
+
+    def get_many(self, collection: str, keys) -> dict:
+        # key -> record for the keys that exist
+        found = ((key, self.get(collection, key)) for key in set(keys))
+        return {key: record for key, record in found if record is not None}
+
+    def all(self, collection: str) -> list[dict]:
+        raise NotImplementedError
+
+    def find(self, collection: str, **criteria) -> list[dict]:
+        # Records whose fields equal every criterion
+        raise NotImplementedError
+
+    def range(self, collection: str, field: str, start=None, end=None,
+              limit: int | None = None) -> list[dict]:
+        # Records with start <= record[field] < end, in field order; only
+        # the first `limit` of them if given
+        raise NotImplementedError
+
+    def page(self, collection: str, field: str, value, before=None,
+             after=None, limit: int = 50) -> list[dict]:
+        # Records with record[field] == value, by ascending key.
+        # after -> the next `limit` keys above it; before (or no cursor)
+        # -> the `limit` keys just below it, i.e. the latest page.
+        raise NotImplementedError
+
+    def count(self, collection: str, **criteria) -> int:
+        raise NotImplementedError
+
+    def count_by(self, collection: str, field: str, **criteria) -> dict:
+        # {value of field: number of records} over records matching criteria
+        return dict(Counter(r.get(field) for r in self.find(collection, **criteria)))
+
+    def match_words(self, collection: str, fields, words) -> list[dict]:
+        # Records where every word starts a word in one of the fields
+        patterns = [re.compile(r"(?<!\w)" + re.escape(w), re.IGNORECASE) for w in words]
+        return [
+            r for r in self.all(collection)
+            if all(any(p.search(str(r.get(f) or "")) for f in fields) for p in patterns)
+        ]
+
+    def count_words(self, collection: str, fields, words) -> int:
+        return len(self.match_words(collection, fields, words))
+
+    def revision(self, collection: str) -> int:
+        # Latest revision handed out in a REVISIONED collection
+        raise NotImplementedError
+
+    def version(self, *collections: str) -> str:
+        # Opaque token that changes whenever a record in any of the
+        # collections is written; cheap enough to check on every request
+        raise NotImplementedError
+
+    def changes(self, collection: str, since: int) -> dict | None:
+        # {"rev", "upserts", "deleted"} covering every write after revision
+        # `since`, or None when that is older than the retained history (or
+        # unknown) and the client has to reload the whole collection.
+        # "deleted" holds tombstones, {"key", **TOMBSTONE_FIELDS} with
+        # the old values, plus "moved" if the record still exists.
+        raise NotImplementedError
+
+    # ---------------- WRITES ----------------
+
+    def transaction(self):
+        # Context manager grouping mutations: they become visible to other
+        # requests and durable together, or not at all if the block
+        # raises. Nested transactions join the outermost one.
+        raise NotImplementedError
+
+    def after_commit(self, callback):
+        # callback() runs once the current transaction has committed, or
+        # right away outside one; it is dropped if the transaction fails
+        raise NotImplementedError
+
+    def next_id(self, collection: str) -> int:
+        # Never hands out the same id twice, across deletes and restarts
+        raise NotImplementedError
+
+    def next_rev(self, collection: str) -> int:
+        raise NotImplementedError
+
+    def _stamp(self, collection: str, record: dict) -> dict:
+        if collection not in REVISIONED:
+            return record
+        return {
+            **record,
+            "rev": self.next_rev(collection),
+            "updated_at": datetime.now().isoformat()
+        }
+
+    def _tombstone_of(self, collection: str, key, old: dict,
+                      new: dict | None = None) -> dict | None:
+        # For a delete (new is None), or an update that changes one of
+        # TOMBSTONE_FIELDS; None for any other update
+        fields = TOMBSTONE_FIELDS.get(collection, ())
+        if new is not None and all(old.get(f) == new.get(f) for f in fields):
+            return None
+
+        tombstone = {"key": key, **{f: old.get(f) for f in fields}}
+        if new is not None:
+            tombstone["moved"] = True
+        return tombstone
+
+    def insert(self, collection: str, record: dict) -> dict:
+        # Assigns an "id" when the record has none; returns the stored record
+        raise NotImplementedError
+
+    def update(self, collection: str, key, changes: dict,
+               expected_rev: int | None = None) -> dict | None:
+        # Returns the updated record, or None if there is no such key.
+        # With expected_rev, raises VersionConflict unless the record is
+        # still at that revision (compare-and-set).
+        raise NotImplementedError
+
+    def delete(self, collection: str, key,
+               expected_rev: int | None = None) -> dict | None:
+        # Returns the removed record, or None if there is no such key
+        raise NotImplementedError
+
+    def delete_where(self, collection: str, **criteria) -> int:
+        with self.transaction():
+            keys = [self.key(collection, r) for r in self.find(collection, **criteria)]
+            for key in keys:
+                self.delete(collection, key)
+        return len(keys)
+
+    # ---------------- ASYNC ACCESS ----------------
+
+    async def aread(self, fn, *args, **kwargs):
+        return await asyncio.to_thread(fn, *args, **kwargs)
+
+    async def awrite(self, fn, *args, **kwargs):
+        return await asyncio.to_thread(fn, *args, **kwargs)
+
+    # ---------------- COORDINATION ----------------
+
+    def lease(self, name: str, owner: str, seconds: float) -> bool:
+        # True while `owner` holds the named lease, renewing it for
+        # `seconds`; only one owner at a time across processes
+        return True
+
+    # ---------------- CHANGE FEED ----------------
+
+    def subscribe(self, collection: str, listener):
+        # listener(old, new) is called for every change made through this
+        # process: old is None for inserts, new is None for deletes.
+        # Records already stored are fed in as inserts, so derived state
+        # (counters, inboxes, schedules) can be built from it alone.
+        raise NotImplementedError
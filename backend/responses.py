@@ -0,0 +1,73 @@
+import hashlib
+import json
+
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel
+
+try:
+    import orjson  # optional: stdlib json is used without it
+except ImportError:
+    orjson = None
+
+
+# =========================================================
+# FAST JSON RESPONSES
+# =========================================================
+# Opt-in for the big list endpoints: skips FastAPI's jsonable_encoder and
+# response_model pass over every row and encodes the list in one go. The
+# route still declares its response_model, which documents the shape in
+# OpenAPI but is not enforced here - only use this where every write path
+# validates what it stores (e.g. TaskIn/TaskUpdate for tasks).
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(
+            content, ensure_ascii=False, separators=(",", ":")
+        ).encode("utf-8")
+
+
+def project(records: list[dict], model: type[BaseModel]) -> list[dict]:
+    # Keep only the model's fields, e.g. to leave password hashes out
+    fields = tuple(model.model_fields)
+    return [{f: r.get(f) for f in fields} for r in records]
+
+
+# =========================================================
+# CONDITIONAL GET
+# =========================================================
+# List endpoints tag their response with a hash of the storage versions
+# it was built from and of who asked, and answer If-None-Match with 304
+# without reading the collection. Take the tag before reading the data:
+# a write landing in between then only costs the client a refetch.
+# Tags are weak since compression may change the bytes.
+
+REVALIDATE = "private, no-cache"
+
+
+def list_etag(user_id: int, role: str, *versions) -> str:
+    digest = hashlib.blake2b(
+        repr((user_id, role, *versions)).encode(), digest_size=12
+    ).hexdigest()
+    return f'W/"{digest}"'
+
+
+def etag_matches(if_none_match: str | None, tag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+
+    opaque = tag.removeprefix("W/")
+    return any(
+        t.strip().removeprefix("W/") == opaque for t in if_none_match.split(",")
+    )
+
+
+def cache_headers(tag: str) -> dict:
+    return {"ETag": tag, "Cache-Control": REVALIDATE}
+
+
+def not_modified(tag: str) -> Response:
+    return Response(status_code=304, headers=cache_headers(tag))
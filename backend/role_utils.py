@@ -1,7 +1,7 @@
 from fastapi import Header, HTTPException
 from auth_utils import decode_token
 
-def get_payload(Authorization: str = Header(None)):
+async def get_payload(Authorization: str = Header(None)):
     if not Authorization:
         raise HTTPException(status_code=401, detail="Missing Authorization header")
 
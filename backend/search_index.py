@@ -0,0 +1,159 @@
+import math
+import re
+import threading
+from bisect import bisect_left, insort
+
+from storage import db
+from core.config import SEARCH_PREFIX_EXPANSION
+
+# =========================================================
+# FULL-TEXT SEARCH
+# =========================================================
+# One inverted index per searchable collection, kept in step with the
+# storage engine through subscribe(): term -> {record key: weight}, where
+# weight is the term count scaled by the field's weight (a hit in a title
+# counts more than one in a description). Terms are also kept in a sorted
+# vocabulary, so a prefix maps to a contiguous slice found by bisect.
+#
+# Every query word must match (exactly, or as a prefix of a longer word).
+# Results are ranked by sum(weight * idf), exact matches counting fully
+# and prefix matches a bit less. A query only holds the index lock long
+# enough to copy the postings it needs; scoring happens outside it, so
+# writes (whose listeners take the lock) aren't held up by a broad query.
+#
+# A shared store (MongoDB) is written by other workers too, so there no
+# index is kept: the store finds the records matching every word, and
+# they are scored the same way, with idf taken per query word.
+
+TOKEN_RE = re.compile(r"\w+")
+PREFIX_FACTOR = 0.7
+
+
+def tokenize(text) -> list[str]:
+    return TOKEN_RE.findall(str(text).lower()) if text else []
+
+
+class InvertedIndex:
+    def __init__(self, collection: str, fields: dict[str, float]):
+        self.collection = collection
+        self.fields = fields
+        self.postings: dict[str, dict] = {}
+        self.vocab: list[str] = []
+        self.docs: dict = {}  # key -> {term: weight}, to undo on change
+        self._lock = threading.Lock()
+
+    def _weights(self, record: dict) -> dict[str, float]:
+        weights: dict[str, float] = {}
+        for field, boost in self.fields.items():
+            for term in tokenize(record.get(field)):
+                weights[term] = weights.get(term, 0.0) + boost
+        return weights
+
+    def on_change(self, old: dict | None, new: dict | None):
+        key = db.key(self.collection, new or old)
+        with self._lock:
+            for term in self.docs.pop(key, {}):
+                posting = self.postings[term]
+                del posting[key]
+                if not posting:
+                    del self.postings[term]
+                    del self.vocab[bisect_left(self.vocab, term)]
+
+            if new is None:
+                return
+
+            weights = self._weights(new)
+            if weights:
+                self.docs[key] = weights
+            for term, weight in weights.items():
+                if term not in self.postings:
+                    self.postings[term] = {}
+                    insort(self.vocab, term)
+                self.postings[term][key] = weight
+
+    def _expand(self, word: str) -> list[str]:
+        # The word itself plus up to SEARCH_PREFIX_EXPANSION longer terms
+        start = bisect_left(self.vocab, word)
+        end = start
+        while (end < len(self.vocab) and end - start <= SEARCH_PREFIX_EXPANSION
+               and self.vocab[end].startswith(word)):
+            end += 1
+        return self.vocab[start:end]
+
+    def search(self, query: str) -> list[tuple[float, dict]]:
+        # (score, record), best first
+        words = list(dict.fromkeys(tokenize(query)))
+        if not words:
+            return []
+        if db.shared:
+            return self._search_store(words)
+
+        with self._lock:
+            total = len(self.docs) or 1
+            postings = [
+                [(term, dict(self.postings[term])) for term in self._expand(word)]
+                for word in words
+            ]
+
+        scores: dict | None = None
+        for word, terms in zip(words, postings):
+            matches: dict = {}
+            for term, posting in terms:
+                idf = math.log(1 + total / len(posting))
+                factor = 1.0 if term == word else PREFIX_FACTOR
+                for key, weight in posting.items():
+                    if scores is not None and key not in scores:
+                        continue
+                    score = weight * idf * factor
+                    if score > matches.get(key, 0.0):
+                        matches[key] = score
+
+            # All words must match
+            if scores is None:
+                scores = matches
+            else:
+                scores = {k: scores[k] + s for k, s in matches.items()}
+            if not scores:
+                return []
+
+        return _ranked(scores, db.get_many(self.collection, scores))
+
+    def _search_store(self, words: list[str]) -> list[tuple[float, dict]]:
+        records = db.match_words(self.collection, tuple(self.fields), words)
+        if not records:
+            return []
+
+        total = db.count(self.collection) or 1
+        idf = {}
+        for word in words:
+            matched = len(records) if len(words) == 1 else db.count_words(
+                self.collection, tuple(self.fields), [word]
+            )
+            idf[word] = math.log(1 + total / max(matched, 1))
+
+        scores = {}
+        by_key = {db.key(self.collection, record): record for record in records}
+        for key, record in by_key.items():
+            weights = self._weights(record)
+            scores[key] = sum(
+                max((
+                    weight * idf[word] * (1.0 if term == word else PREFIX_FACTOR)
+                    for term, weight in weights.items() if term.startswith(word)
+                ), default=0.0)
+                for word in words
+            )
+        return _ranked(scores, by_key)
+
+
+def _ranked(scores: dict, records: dict) -> list[tuple[float, dict]]:
+    # Ties by key; keys whose record is gone by now are dropped
+    ranked = sorted(scores.items(), key=lambda x: (-x[1], x[0]))
+    return [(s, records[k]) for k, s in ranked if k in records]
+
+
+tasks_index = InvertedIndex("tasks", {"title": 3.0, "category": 2.0, "description": 1.0})
+messages_index = InvertedIndex("messages", {"message": 1.0, "file_name": 1.0})
+
+if not db.shared:
+    db.subscribe("tasks", tasks_index.on_change)
+    db.subscribe("messages", messages_index.on_change)
@@ -0,0 +1,57 @@
+import asyncio
+
+from fastapi import APIRouter, Depends, Query
+from storage import db
+from role_utils import get_payload
+from membership_utils import group_ids_for
+from chat_routes import chat_payload, sender_names
+from search_index import tasks_index, messages_index
+
+router = APIRouter(prefix="/search", tags=["Search"])
+
+
+# -------------------------------------------------
+# SEARCH TASKS + CHAT MESSAGES
+# -------------------------------------------------
+# Same visibility as listing: users only see tasks assigned to them and
+# messages of groups they belong to; admins see everything.
+@router.get("/")
+async def search(
+    q: str = Query(..., min_length=1, description="Words to find; the last letters of a word may be left out"),
+    kind: str = Query("all", alias="type", pattern="^(all|tasks|messages)$"),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    payload: dict = Depends(get_payload)
+):
+    # Ranking is CPU work: keep it off the event loop on every backend
+    return await asyncio.to_thread(
+        _search, q, kind, offset, limit, payload["user_id"], payload["role"]
+    )
+
+
+def _search(q: str, kind: str, offset: int, limit: int, user_id: int, role: str) -> dict:
+    hits = []
+
+    if kind in ("all", "tasks"):
+        for score, task in tasks_index.search(q):
+            if role == "admin" or task["assigned_to"] == user_id:
+                hits.append((score, "task", task))
+
+    if kind in ("all", "messages"):
+        groups = None if role == "admin" else set(group_ids_for(user_id))
+        for score, m in messages_index.search(q):
+            if groups is None or m["group_id"] in groups:
+                hits.append((score, "message", m))
+
+    hits.sort(key=lambda hit: -hit[0])
+
+    page = hits[offset:offset + limit]
+    senders = sender_names(r for _, hit_type, r in page if hit_type == "message")
+
+    results = []
+    for score, hit_type, record in page:
+        if hit_type == "message":
+            record = {**chat_payload(record, senders), "group_id": record["group_id"]}
+        results.append({"type": hit_type, "score": round(score, 3), hit_type: record})
+
+    return {"total": len(hits), "results": results}
@@ -0,0 +1,101 @@
+import os
+import re
+import hashlib
+from urllib.parse import parse_qs
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import StaticFiles, NotModifiedResponse
+
+try:
+    from PIL import Image  # optional: thumbnails are skipped without Pillow
+except ImportError:
+    Image = None
+
+
+# =========================================================
+# /uploads STATIC FILES
+# =========================================================
+# Uploaded files are never rewritten (uuid or content-hash names), so
+# they are served as immutable with a strong ETag and answer conditional
+# GETs with 304. Range requests come from FileResponse. Images can be
+# fetched as ?thumb=<size>; thumbnails are generated once and cached
+# under .thumbs/.
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+THUMB_SIZES = (64, 128, 256, 512)
+THUMB_DIR = ".thumbs"
+IMAGE_EXTS = {".png", ".jpg", ".jpeg", ".gif", ".webp", ".bmp"}
+
+_content_hash_name = re.compile(r"^[0-9a-f]{64}$")
+
+
+def _strong_etag(full_path: str, stat_result: os.stat_result) -> str:
+    stem = os.path.splitext(os.path.basename(full_path))[0]
+    if _content_hash_name.match(stem):
+        return f'"{stem}"'
+
+    base = f"{stat_result.st_ino}-{stat_result.st_mtime_ns}-{stat_result.st_size}"
+    return f'"{hashlib.sha256(base.encode()).hexdigest()[:32]}"'
+
+
+def _make_thumbnail(full_path: str, size: int) -> str:
+    directory, name = os.path.split(full_path)
+    thumb_dir = os.path.join(directory, THUMB_DIR)
+    thumb_path = os.path.join(thumb_dir, f"{size}-{name}")
+
+    if not os.path.exists(thumb_path):
+        os.makedirs(thumb_dir, exist_ok=True)
+        tmp_path = thumb_path + ".part"
+        with Image.open(full_path) as img:
+            img.thumbnail((size, size))
+            img.save(tmp_path, format=img.format)
+        os.replace(tmp_path, thumb_path)
+
+    return thumb_path
+
+
+class UploadsStaticFiles(StaticFiles):
+    async def get_response(self, path: str, scope):
+        size = self._thumb_size(scope)
+        ext = os.path.splitext(path)[1].lower()
+
+        if size and Image is not None and ext in IMAGE_EXTS:
+            full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path)
+            if stat_result is not None:
+                try:
+                    thumb_path = await anyio.to_thread.run_sync(
+                        _make_thumbnail, full_path, size
+                    )
+                except OSError:
+                    # Not a readable image after all: serve the original
+                    pass
+                else:
+                    return self.file_response(thumb_path, os.stat(thumb_path), scope)
+
+        return await super().get_response(path, scope)
+
+    def _thumb_size(self, scope) -> int | None:
+        query = parse_qs(scope.get("query_string", b"").decode())
+        try:
+            requested = int(query.get("thumb", [""])[0])
+        except ValueError:
+            return None
+        # Snap to a fixed set so the cache can't be filled with odd sizes
+        return next((s for s in THUMB_SIZES if s >= requested), THUMB_SIZES[-1])
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200):
+        response = FileResponse(
+            full_path,
+            status_code=status_code,
+            stat_result=stat_result,
+            headers={
+                "etag": _strong_etag(str(full_path), stat_result),
+                "cache-control": IMMUTABLE_CACHE
+            }
+        )
+
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
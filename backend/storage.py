@@ -0,0 +1,10 @@
+from core.config import STORAGE_BACKEND, MONGO_URI, MONGO_DB
+
+# The storage backend every route and util module uses (see repository.py).
+# "json" serves one process only; run several workers or hosts on "mongo".
+
+if STORAGE_BACKEND == "mongo":
+    from database import MongoDB
+    db = MongoDB(MONGO_URI, MONGO_DB)
+else:
+    from json_db import db
@@ -1,17 +1,46 @@
-from fastapi import APIRouter, Depends, HTTPException
-from pydantic import BaseModel
-from typing import Optional
-from json_db import load_db, save_db
+from fastapi import APIRouter, Depends, HTTPException, Query, Header, Response
+from pydantic import BaseModel, ConfigDict, ValidationError, field_validator
+from typing import Optional, Literal
+from storage import db
+from repository import VersionConflict
 from role_utils import get_payload
 from utils import calculate_priority
 from activity_utils import log_activity
 from notifications_utils import create_notification
+from task_stats import get_stats
+from events import task_event, task_deleted_event
+from responses import (
+    FastJSONResponse, list_etag, etag_matches, cache_headers, not_modified
+)
+from core.config import TASK_BULK_LIMIT
 
 
    # 🔥 SMART PRIORITY
 
 router = APIRouter(prefix="/tasks")
 
+
+# A task's ETag is its revision; PUT/DELETE with If-Match only apply if
+# the task is still at that revision
+def etag(task: dict) -> str:
+    return f'"{task.get("rev", 0)}"'
+
+
+def expected_rev(if_match: str | None) -> int | None:
+    if if_match is None or if_match.strip() == "*":
+        return None
+    try:
+        return int(if_match.strip().removeprefix("W/").strip('"'))
+    except ValueError:
+        return 0   # matches no revision
+
+
+def precondition_failed():
+    return HTTPException(
+        status_code=412,
+        detail="Task was changed by someone else, reload it and try again"
+    )
+
 class TaskIn(BaseModel):
     title: str
     description: Optional[str] = ""
@@ -22,15 +51,49 @@ class TaskIn(BaseModel):
     assigned_to: Optional[int] = None
 
 
+# Fields a PUT or bulk update may change; anything else is rejected.
+# Leaving a field out keeps it, but only description and due_date can be
+# cleared with an explicit null.
+class TaskUpdate(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    title: Optional[str] = None
+    description: Optional[str] = None
+    priority: Optional[str] = None
+    category: Optional[str] = None
+    due_date: Optional[str] = None
+    status: Optional[str] = None
+    assigned_to: Optional[int] = None
+
+    @field_validator("title", "priority", "category", "status", "assigned_to")
+    @classmethod
+    def not_null(cls, value):
+        if value is None:
+            raise ValueError("may not be null")
+        return value
+
+
+class TaskOut(TaskIn):
+    model_config = ConfigDict(extra="allow")
+
+    id: int
+    created_by: Optional[int] = None
+    rev: Optional[int] = None
+    updated_at: Optional[str] = None
+
+
 # -----------------------------------------------------------
 # CREATE TASK
 # -----------------------------------------------------------
 @router.post("/")
-def create_task(task: TaskIn, payload: dict = Depends(get_payload)):
-    db = load_db()
+async def create_task(task: TaskIn, payload: dict = Depends(get_payload)):
     user_id = payload["user_id"]
-    role = payload["role"]
+    priority = _prepare_task(task, user_id, payload["role"])
+
+    return await db.awrite(_insert_task, task, priority, user_id)
+
 
+def _prepare_task(task: TaskIn, user_id: int, role: str) -> str:
     # ----------------------------
     # Role-based assignment
     # ----------------------------
@@ -43,49 +106,50 @@ def create_task(task: TaskIn, payload: dict = Depends(get_payload)):
     # ----------------------------
     # Smart Priority
     # ----------------------------
-    auto_priority = calculate_priority(task.due_date)
-    final_priority = auto_priority if auto_priority else task.priority
-
-    # ----------------------------
-    # Safe Task ID
-    # ----------------------------
-    new_id = max([t["id"] for t in db["tasks"]], default=0) + 1
-
-    new_task = {
-        "id": new_id,
-        "title": task.title,
-        "description": task.description,
-        "priority": final_priority,
-        "category": task.category,
-        "due_date": task.due_date,
-        "status": task.status,
-        "assigned_to": task.assigned_to,
-        "created_by": user_id
-    }
-
-    db["tasks"].append(new_task)
-
-    # ----------------------------
-    # Activity Log
-    # ----------------------------
-    log_activity(
-        db,
-        new_id,
-        user_id,
-        f"Task created: {task.title}"
-    )
-
-    # 🔔 TRIGGER NOTIFICATION – HIGH PRIORITY + PENDING
-    if new_task["priority"] == "high" and new_task["status"] == "pending":
-        create_notification(
-            db,
-            task.assigned_to,
-            new_task["id"],          # ✅ task_id added
-            f"New task created: {task.title}"
+    auto_priority = smart_priority(task.due_date)
+    return auto_priority if auto_priority else task.priority
+
+
+def smart_priority(due_date) -> str | None:
+    try:
+        return calculate_priority(due_date)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=422, detail="due_date must be YYYY-MM-DD")
+
+
+def _insert_task(task: TaskIn, priority: str, user_id: int) -> dict:
+    with db.transaction():
+        new_task = db.insert("tasks", {
+            "title": task.title,
+            "description": task.description,
+            "priority": priority,
+            # Priority derived from the due date, moved by the scheduler
+            "auto_priority": priority if task.due_date else None,
+            "category": task.category,
+            "due_date": task.due_date,
+            "status": task.status,
+            "assigned_to": task.assigned_to,
+            "created_by": user_id
+        })
+
+        # ----------------------------
+        # Activity Log
+        # ----------------------------
+        log_activity(
+            new_task["id"],
+            user_id,
+            f"Task created: {task.title}"
         )
+        task_event("task.created", new_task)
+
+        # 🔔 TRIGGER NOTIFICATION – HIGH PRIORITY + PENDING
+        if new_task["priority"] == "high" and new_task["status"] == "pending":
+            create_notification(
+                task.assigned_to,
+                new_task["id"],          # ✅ task_id added
+                f"New task created: {task.title}"
+            )
 
-
-    save_db(db)
     return new_task
 
 
@@ -93,91 +157,283 @@ def create_task(task: TaskIn, payload: dict = Depends(get_payload)):
 # -----------------------------------------------------------
 # GET TASKS
 # -----------------------------------------------------------
-@router.get("/")
-def list_tasks(payload: dict = Depends(get_payload)):
-    db = load_db()
+@router.get("/", response_model=list[TaskOut])
+async def list_tasks(
+    if_none_match: str | None = Header(None),
+    payload: dict = Depends(get_payload)
+):
     user_id = payload["user_id"]
     role = payload["role"]
 
+    tag = list_etag(user_id, role, await db.aread(db.version, "tasks"))
+    if etag_matches(if_none_match, tag):
+        return not_modified(tag)
+
     if role == "admin":
-        return db["tasks"]
+        tasks = await db.aread(db.all, "tasks")
+    else:
+        tasks = await db.aread(db.find, "tasks", assigned_to=user_id)
 
-    return [t for t in db["tasks"] if t["assigned_to"] == user_id]
+    return FastJSONResponse(tasks, headers=cache_headers(tag))
 
 
 # -----------------------------------------------------------
-# UPDATE TASK
+# TASK STATS (counts only, for dashboards)
 # -----------------------------------------------------------
-@router.put("/{task_id}")
-def update_task(task_id: int, updates: dict, payload: dict = Depends(get_payload)):
-    db = load_db()
-    user_id = payload["user_id"]
-    role = payload["role"]
+@router.get("/stats")
+async def task_stats(payload: dict = Depends(get_payload)):
+    if payload["role"] == "admin":
+        return await db.aread(get_stats)
+
+    return await db.aread(get_stats, payload["user_id"])
+
 
-    for t in db["tasks"]:
-        if t["id"] == task_id:
+# -----------------------------------------------------------
+# TASK CHANGES (delta sync: what changed after revision `since`)
+# -----------------------------------------------------------
+@router.get("/changes")
+async def task_changes(
+    since: int = Query(0, ge=0, description="Last task revision the client has"),
+    payload: dict = Depends(get_payload)
+):
+    return await db.aread(_task_changes, since, payload["user_id"], payload["role"])
 
-            # Permission check
-            if role == "user" and t["assigned_to"] != user_id:
-                raise HTTPException(status_code=403, detail="Permission denied")
 
-            # ✅ STORE OLD STATUS BEFORE UPDATE
-            old_status = t["status"]
+def _task_changes(since: int, user_id: int, role: str) -> dict:
+    rev = db.revision("tasks")
+    delta = db.changes("tasks", since) if since else None
 
-            # 🔥 SMART PRIORITY ON UPDATE
-            if "due_date" in updates:
-                auto_priority = calculate_priority(updates.get("due_date"))
-                if auto_priority:
-                    updates["priority"] = auto_priority
+    # First sync, or too far behind (or ahead, after a restore): send the
+    # whole list
+    if delta is None:
+        tasks = db.all("tasks") if role == "admin" else db.find("tasks", assigned_to=user_id)
+        return {"rev": rev, "reset": True, "upserts": tasks, "deleted": []}
 
-            # ✅ UPDATE TASK
-            t.update(updates)
+    upserts, tombstones = delta["upserts"], delta["deleted"]
 
-            # ✅ ACTIVITY LOG (AFTER UPDATE)
-            if "status" in updates and updates["status"] != old_status:
-                log_activity(
-                    db,
-                    task_id,
-                    user_id,
-                    f"Status changed from {old_status} to {updates['status']}"
-                )
-                create_notification(
-                    db,
-                    t["assigned_to"],
-                    t["id"],                 # ✅ task_id
-                    f"Task '{t['title']}' status changed to {updates['status']}",
-            
-                )
+    # Admins see every deletion. A user only hears about tasks that were
+    # theirs: deleted, or reassigned to someone else (unless they have
+    # since come back, in which case they are among the upserts).
+    if role == "admin":
+        deleted = [t["key"] for t in tombstones if not t.get("moved")]
+    else:
+        upserts = [t for t in upserts if t["assigned_to"] == user_id]
+        kept = {t["id"] for t in upserts}
+        deleted = list(dict.fromkeys(
+            t["key"] for t in tombstones
+            if t.get("assigned_to") == user_id and t["key"] not in kept
+        ))
 
-            save_db(db)
-            return {"message": "updated"}
+    return {"rev": delta["rev"], "reset": False, "upserts": upserts, "deleted": deleted}
 
-    raise HTTPException(status_code=404, detail="Task not found")
 
 # -----------------------------------------------------------
-# DELETE TASK
+# GET ONE TASK (with its ETag)
 # -----------------------------------------------------------
-@router.delete("/{task_id}")
-def delete_task(task_id: int, payload: dict = Depends(get_payload)):
-    db = load_db()
-    user_id = payload["user_id"]
-    role = payload["role"]
+@router.get("/{task_id}")
+async def get_task(task_id: int, response: Response, payload: dict = Depends(get_payload)):
+    t = await db.aread(_load_task, task_id, payload["user_id"], payload["role"])
+    response.headers["ETag"] = etag(t)
+    return t
+
+
+# -----------------------------------------------------------
+# UPDATE TASK
+# -----------------------------------------------------------
+@router.put("/{task_id}")
+async def update_task(
+    task_id: int,
+    updates: TaskUpdate,
+    response: Response,
+    if_match: str | None = Header(None),
+    payload: dict = Depends(get_payload)
+):
+    try:
+        t = await db.awrite(
+            _update_task, task_id, updates.model_dump(exclude_unset=True),
+            payload["user_id"], payload["role"], expected_rev(if_match)
+        )
+    except VersionConflict:
+        raise precondition_failed()
+
+    response.headers["ETag"] = etag(t)
+    return {"message": "updated"}
+
 
-    for t in db["tasks"]:
-        if t["id"] == task_id:
+def _load_task(task_id: int, user_id: int, role: str, rev: int | None = None) -> dict:
+    t = db.get("tasks", task_id)
+    if not t:
+        raise HTTPException(status_code=404, detail="Task not found")
 
-            if role == "user" and t["assigned_to"] != user_id:
-                raise HTTPException(status_code=403, detail="Permission denied")
+    # Permission check
+    if role == "user" and t["assigned_to"] != user_id:
+        raise HTTPException(status_code=403, detail="Permission denied")
+
+    # Compare-and-set before any side effect (activity log, notification)
+    if rev is not None and t.get("rev") != rev:
+        raise VersionConflict("tasks", task_id)
+
+    return t
+
+
+def _update_task(task_id: int, updates: dict, user_id: int, role: str,
+                 rev: int | None = None) -> dict:
+    with db.transaction():
+        t = _load_task(task_id, user_id, role, rev)
+
+        # ✅ STORE OLD STATUS BEFORE UPDATE
+        old_status = t["status"]
+
+        # 🔥 SMART PRIORITY ON UPDATE
+        if "due_date" in updates:
+            auto_priority = smart_priority(updates.get("due_date"))
+            if auto_priority:
+                updates["priority"] = auto_priority
+            updates["auto_priority"] = auto_priority
+        elif "priority" in updates:
+            # Set by hand: the scheduler leaves it alone from now on
+            updates["auto_priority"] = None
+
+        # ✅ UPDATE TASK (compare-and-set when the client sent a revision)
+        old = t
+        t = db.update("tasks", task_id, updates, expected_rev=rev)
+        task_event("task.updated", t, old)
+
+        # ✅ ACTIVITY LOG (AFTER UPDATE)
+        if "status" in updates and updates["status"] != old_status:
             log_activity(
-                db,
                 task_id,
                 user_id,
-                f"Task deleted: {t['title']}"
+                f"Status changed from {old_status} to {updates['status']}"
+            )
+            create_notification(
+                t["assigned_to"],
+                t["id"],                 # ✅ task_id
+                f"Task '{t['title']}' status changed to {updates['status']}",
             )
 
-            db["tasks"].remove(t)
-            save_db(db)
-            return {"message": "deleted"}
+    return t
+
+# -----------------------------------------------------------
+# DELETE TASK
+# -----------------------------------------------------------
+@router.delete("/{task_id}")
+async def delete_task(
+    task_id: int,
+    if_match: str | None = Header(None),
+    payload: dict = Depends(get_payload)
+):
+    try:
+        await db.awrite(
+            _delete_task, task_id, payload["user_id"], payload["role"],
+            expected_rev(if_match)
+        )
+    except VersionConflict:
+        raise precondition_failed()
+
+    return {"message": "deleted"}
+
+
+def _delete_task(task_id: int, user_id: int, role: str, rev: int | None = None):
+    with db.transaction():
+        t = _load_task(task_id, user_id, role, rev)
+        log_activity(
+            task_id,
+            user_id,
+            f"Task deleted: {t['title']}"
+        )
+
+        db.delete("tasks", task_id, expected_rev=rev)
+        task_deleted_event(t)
 
-    raise HTTPException(status_code=404, detail="Task not found")
 
+# -----------------------------------------------------------
+# BULK OPERATIONS (create / update / delete in one commit)
+# -----------------------------------------------------------
+class BulkOperation(BaseModel):
+    op: Literal["create", "update", "delete"]
+    id: Optional[int] = None          # update / delete
+    task: Optional[TaskIn] = None     # create
+    changes: Optional[dict] = None    # update, e.g. {"assigned_to": 3} to reassign
+    rev: Optional[int] = None         # update / delete: only at this revision
+
+
+class BulkIn(BaseModel):
+    operations: list[BulkOperation]
+
+
+@router.post("/bulk")
+async def bulk_tasks(data: BulkIn, payload: dict = Depends(get_payload)):
+    if len(data.operations) > TASK_BULK_LIMIT:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {TASK_BULK_LIMIT} operations per request"
+        )
+
+    try:
+        results = await db.awrite(
+            _apply_bulk, data.operations, payload["user_id"], payload["role"]
+        )
+    except VersionConflict:
+        # Lost a race with another process at commit time
+        raise precondition_failed()
+    failed = sum(not r["ok"] for r in results)
+
+    return {"applied": len(results) - failed, "failed": failed, "results": results}
+
+
+def _apply_bulk(operations: list[BulkOperation], user_id: int, role: str) -> list[dict]:
+    # Every operation, with its activity logs and notifications, lands in
+    # one transaction; a failing item is reported and the rest still apply.
+    # Items check everything (existence, permission, revision, due date)
+    # before their first write, so a failed item leaves nothing behind.
+    results = []
+
+    with db.transaction():
+        for index, item in enumerate(operations):
+            try:
+                task_id = _apply_operation(item, user_id, role)
+            except HTTPException as e:
+                results.append({
+                    "index": index, "ok": False,
+                    "status": e.status_code, "detail": e.detail
+                })
+            else:
+                results.append({"index": index, "ok": True, "id": task_id})
+
+    return results
+
+
+def _apply_operation(item: BulkOperation, user_id: int, role: str) -> int:
+    if item.op == "create":
+        if item.task is None:
+            raise HTTPException(status_code=422, detail="create needs a task")
+        priority = _prepare_task(item.task, user_id, role)
+        return _insert_task(item.task, priority, user_id)["id"]
+
+    if item.id is None:
+        raise HTTPException(status_code=422, detail=f"{item.op} needs an id")
+
+    try:
+        if item.op == "update":
+            if not item.changes:
+                raise HTTPException(status_code=422, detail="update needs changes")
+            _update_task(item.id, _validate_changes(item.changes), user_id, role, item.rev)
+        else:
+            _delete_task(item.id, user_id, role, item.rev)
+    except VersionConflict:
+        raise precondition_failed()
+
+    return item.id
+
+
+def _validate_changes(changes: dict) -> dict:
+    # Checked per item, so one bad item doesn't reject the whole request
+    try:
+        update = TaskUpdate.model_validate(changes)
+    except ValidationError as e:
+        raise HTTPException(
+            status_code=422,
+            detail=e.errors(include_url=False, include_context=False, include_input=False)
+        )
+    return update.model_dump(exclude_unset=True)
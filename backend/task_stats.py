@@ -0,0 +1,109 @@
+import threading
+from collections import Counter
+from datetime import date, timedelta
+
+from storage import db
+
+# =========================================================
+# TASK STATISTICS
+# =========================================================
+# Counters are kept per assignee (plus a global copy) and adjusted on
+# every task change through the storage engine, so /tasks/stats never
+# scans tasks. Open tasks are also counted per due date; those counts are
+# folded into buckets relative to today at read time, which is
+# O(distinct due dates).
+#
+# A shared store (MongoDB) is written by other workers too, so there the
+# same counters are built per request from grouped counts instead.
+
+DIMENSIONS = ("status", "priority", "category")
+
+def _empty() -> dict:
+    return {
+        "total": 0,
+        **{field: Counter() for field in DIMENSIONS},
+        "due_open": Counter()
+    }
+
+_lock = threading.Lock()
+_global = _empty()
+_by_assignee: dict[int, dict] = {}
+_assignees = Counter()
+
+def _apply(counters: dict, task: dict, sign: int):
+    counters["total"] += sign
+    for field in DIMENSIONS:
+        counters[field][task.get(field)] += sign
+    if task.get("status") != "completed":
+        counters["due_open"][task.get("due_date")] += sign
+
+def _on_task_change(old, new):
+    with _lock:
+        for task, sign in ((old, -1), (new, 1)):
+            if task is None:
+                continue
+            assignee = task.get("assigned_to")
+            _apply(_global, task, sign)
+            _apply(_by_assignee.setdefault(assignee, _empty()), task, sign)
+            _assignees[assignee] += sign
+
+if not db.shared:
+    db.subscribe("tasks", _on_task_change)
+
+
+def _query_counters(user_id: int | None) -> tuple[dict, Counter]:
+    criteria = {} if user_id is None else {"assigned_to": user_id}
+    counters = {field: Counter(db.count_by("tasks", field, **criteria)) for field in DIMENSIONS}
+    counters["total"] = sum(counters["status"].values())
+
+    counters["due_open"] = Counter(db.count_by("tasks", "due_date", **criteria))
+    counters["due_open"].subtract(
+        db.count_by("tasks", "due_date", status="completed", **criteria)
+    )
+
+    assignees = Counter(db.count_by("tasks", "assigned_to")) if user_id is None else Counter()
+    return counters, assignees
+
+
+def _nonzero(counter: Counter) -> dict:
+    return {str(k): v for k, v in counter.items() if v}
+
+def _due_buckets(due_open: Counter) -> dict:
+    today = date.today().isoformat()
+    week_end = (date.today() + timedelta(days=7)).isoformat()
+
+    buckets = {"overdue": 0, "today": 0, "this_week": 0, "later": 0, "no_due_date": 0}
+    for due, n in due_open.items():
+        if not due:
+            buckets["no_due_date"] += n
+        elif due < today:
+            buckets["overdue"] += n
+        elif due == today:
+            buckets["today"] += n
+        elif due <= week_end:
+            buckets["this_week"] += n
+        else:
+            buckets["later"] += n
+    return buckets
+
+def get_stats(user_id: int | None = None) -> dict:
+    # user_id=None -> every task, with a per-assignee breakdown
+    if db.shared:
+        return _format(*_query_counters(user_id), user_id)
+
+    with _lock:
+        counters = _global if user_id is None else _by_assignee.get(user_id, _empty())
+        return _format(counters, _assignees, user_id)
+
+def _format(counters: dict, assignees: Counter, user_id: int | None) -> dict:
+    stats = {
+        "total": counters["total"],
+        "by_status": _nonzero(counters["status"]),
+        "by_priority": _nonzero(counters["priority"]),
+        "by_category": _nonzero(counters["category"]),
+        "by_due": _due_buckets(counters["due_open"])
+    }
+    if user_id is None:
+        stats["by_assignee"] = _nonzero(assignees)
+
+    return stats
@@ -0,0 +1,143 @@
+import json
+import time
+
+import pytest
+
+import json_db
+from json_db import JsonDB
+
+
+def open_db(tmp_path) -> JsonDB:
+    db = JsonDB(str(tmp_path / "data.json"), str(tmp_path / "data.wal"))
+    db.load()
+    return db
+
+
+def crash(db: JsonDB):
+    # Drop the process's state without compacting or closing cleanly
+    db._stop.set()
+    db._wal.close()
+    db._owner.close()
+    db._loaded = False
+
+
+def test_replay_restores_committed_writes(tmp_path):
+    db = open_db(tmp_path)
+    first = db.insert("groups", {"name": "a"})
+    db.update("groups", first["id"], {"name": "b"})
+    second = db.insert("groups", {"name": "c"})
+    db.delete("groups", second["id"])
+    crash(db)
+
+    db = open_db(tmp_path)
+    assert db.all("groups") == [{"id": first["id"], "name": "b"}]
+    # Ids are not reused after deleting the highest one
+    assert db.insert("groups", {"name": "d"})["id"] == second["id"] + 1
+    db.close()
+
+
+def test_torn_tail_is_truncated(tmp_path):
+    (tmp_path / "data.wal").write_text('{"op":"put","c":"gro')
+
+    db = open_db(tmp_path)
+    group = db.insert("groups", {"name": "after crash"})
+    crash(db)
+
+    db = open_db(tmp_path)
+    assert db.get("groups", group["id"]) == group
+    db.close()
+
+
+def test_unterminated_last_line_is_dropped(tmp_path):
+    op = {"op": "put", "c": "groups", "r": {"id": 1, "name": "half"}}
+    (tmp_path / "data.wal").write_text(json.dumps(op))
+
+    db = open_db(tmp_path)
+    group = db.insert("groups", {"name": "next"})
+    crash(db)
+
+    db = open_db(tmp_path)
+    assert db.get("groups", group["id"]) == group
+    db.close()
+
+
+def test_leftover_old_log_survives_compaction(tmp_path):
+    put = lambda gid: json.dumps({"op": "put", "c": "groups", "r": {"id": gid, "name": str(gid)}}) + "\n"
+    (tmp_path / "data.wal.old").write_text(put(1))
+    (tmp_path / "data.wal").write_text(put(2))
+
+    db = open_db(tmp_path)
+    assert not (tmp_path / "data.wal.old").exists()
+    db.insert("groups", {"name": "3"})
+    db.compact()
+    crash(db)
+
+    snapshot = json.loads((tmp_path / "data.json").read_text())
+    assert [g["id"] for g in snapshot["groups"]] == [1, 2, 3]
+
+
+def test_compaction_keeps_later_writes(tmp_path):
+    db = open_db(tmp_path)
+    db.insert("groups", {"name": "before"})
+    db.compact()
+    db.insert("groups", {"name": "after"})
+    crash(db)
+
+    db = open_db(tmp_path)
+    assert [g["name"] for g in db.all("groups")] == ["before", "after"]
+    db.close()
+
+
+def test_compactor_survives_a_failed_snapshot(tmp_path, monkeypatch):
+    monkeypatch.setattr(json_db, "DB_COMPACT_INTERVAL", 0.01)
+    monkeypatch.setattr(json_db, "DB_COMPACT_BYTES", 1)
+    db = open_db(tmp_path)
+
+    failures = []
+    write_snapshot = db._write_snapshot
+
+    def flaky(data):
+        if not failures:
+            failures.append(data)
+            raise OSError(28, "No space left on device")
+        write_snapshot(data)
+
+    monkeypatch.setattr(db, "_write_snapshot", flaky)
+    db.insert("groups", {"name": "a"})
+
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        if failures and not (tmp_path / "data.wal.old").exists():
+            break
+        time.sleep(0.01)
+
+    assert failures
+    snapshot = json.loads((tmp_path / "data.json").read_text())
+    assert [g["name"] for g in snapshot["groups"]] == ["a"]
+    db.close()
+
+
+def test_second_process_is_refused(tmp_path):
+    db = open_db(tmp_path)
+    with pytest.raises(RuntimeError):
+        open_db(tmp_path)
+    db.close()
+
+    # Released on close
+    open_db(tmp_path).close()
+
+
+def test_tombstones_keep_the_assignee(tmp_path):
+    db = open_db(tmp_path)
+    moved = db.insert("tasks", {"title": "a", "assigned_to": 1})
+    gone = db.insert("tasks", {"title": "b", "assigned_to": 1})
+    since = db.revision("tasks")
+    db.update("tasks", moved["id"], {"title": "c"})
+    db.update("tasks", moved["id"], {"assigned_to": 2})
+    db.delete("tasks", gone["id"])
+
+    assert db.changes("tasks", since)["deleted"] == [
+        {"key": moved["id"], "assigned_to": 1, "moved": True},
+        {"key": gone["id"], "assigned_to": 1},
+    ]
+    db.close()
@@ -0,0 +1,124 @@
+import pytest
+
+pytest.importorskip("mongomock")
+
+from database import MongoDB
+from repository import VersionConflict
+
+
+@pytest.fixture
+def db():
+    db = MongoDB("mongomock://", "test")
+    db.load()
+    yield db
+    db.close()
+
+
+def other_process(db: MongoDB) -> MongoDB:
+    # A second client on the same database, like another worker
+    other = MongoDB("mongomock://", "test")
+    other._db = db.mongo
+    return other
+
+
+def test_insert_update_delete(db):
+    user = db.insert("users", {"name": "a", "email": "a@x"})
+    assert db.get("users", user["id"]) == user
+
+    db.update("users", user["id"], {"name": "b"})
+    assert db.get("users", user["id"])["name"] == "b"
+
+    assert db.delete("users", user["id"])["name"] == "b"
+    assert db.get("users", user["id"]) is None
+    assert db.insert("users", {"name": "c", "email": "c@x"})["id"] == user["id"] + 1
+
+
+def test_transaction_is_buffered(db):
+    with db.transaction():
+        group = db.insert("groups", {"name": "g"})
+        db.insert("group_members", {"group_id": group["id"], "user_id": 1})
+        assert db.get("groups", group["id"]) == group
+    assert db.find("group_members", group_id=group["id"]) == [
+        {"group_id": group["id"], "user_id": 1}
+    ]
+
+
+def test_revisions_and_changes(db):
+    first = db.insert("tasks", {"title": "a"})
+    second = db.insert("tasks", {"title": "b"})
+    db.delete("tasks", first["id"])
+
+    assert db.revision("tasks") == 3
+    delta = db.changes("tasks", first["rev"])
+    assert [t["id"] for t in delta["upserts"]] == [second["id"]]
+    assert delta["deleted"] == [{"key": first["id"], "assigned_to": None}]
+
+
+def test_reassignment_leaves_a_tombstone(db):
+    task = db.insert("tasks", {"title": "a", "assigned_to": 1})
+    db.update("tasks", task["id"], {"title": "b"})
+    db.update("tasks", task["id"], {"assigned_to": 2})
+
+    delta = db.changes("tasks", task["rev"])
+    assert delta["deleted"] == [{"key": task["id"], "assigned_to": 1, "moved": True}]
+
+
+def test_compare_and_set(db):
+    task = db.insert("tasks", {"title": "a"})
+    with pytest.raises(VersionConflict):
+        db.update("tasks", task["id"], {"title": "b"}, expected_rev=task["rev"] + 1)
+
+    # Another worker wrote it between our read and our commit
+    with pytest.raises(VersionConflict):
+        with db.transaction():
+            current = db.get("tasks", task["id"])
+            other_process(db).update("tasks", task["id"], {"title": "theirs"})
+            db.update("tasks", task["id"], {"title": "ours"}, expected_rev=current["rev"])
+    assert db.get("tasks", task["id"])["title"] == "theirs"
+
+
+def test_version_moves_for_every_worker(db):
+    before = db.version("tasks", "users")
+    other_process(db).insert("tasks", {"title": "a"})
+    assert db.version("tasks", "users") != before
+
+
+def test_counts_and_word_matches(db):
+    db.insert("tasks", {"title": "Quarterly report", "status": "pending"})
+    db.insert("tasks", {"title": "Reporting board", "status": "completed"})
+    db.insert("tasks", {"title": "Fix login", "status": "pending"})
+
+    assert db.count("tasks", status="pending") == 2
+    assert db.count_by("tasks", "status") == {"pending": 2, "completed": 1}
+    assert {t["title"] for t in db.match_words("tasks", ("title",), ["rep"])} == {
+        "Quarterly report", "Reporting board"
+    }
+    assert db.count_words("tasks", ("title",), ["port"]) == 0
+
+
+def test_lease_has_one_owner(db):
+    other = other_process(db)
+    assert db.lease("job", "a", 60)
+    assert not other.lease("job", "b", 60)
+    assert db.lease("job", "a", 60)
+
+    # Expired leases can be taken over
+    assert db.lease("job", "a", -1)
+    assert other.lease("job", "b", 60)
+
+
+def test_range_limit(db):
+    for day in ("2024-01-03", "2024-01-01", "2024-01-02"):
+        db.insert("activity_logs", {"task_id": 1, "timestamp": day})
+
+    found = db.range("activity_logs", "timestamp", None, "2024-01-03", limit=1)
+    assert [e["timestamp"] for e in found] == ["2024-01-01"]
+
+
+def test_get_many(db):
+    a = db.insert("users", {"name": "a", "email": "a@x"})
+    b = db.insert("users", {"name": "b", "email": "b@x"})
+
+    assert db.get_many("users", [a["id"], b["id"], a["id"], 999]) == {
+        a["id"]: a, b["id"]: b
+    }
@@ -0,0 +1,25 @@
+import pytest
+from fastapi import HTTPException
+
+from task_routes import TaskUpdate, _validate_changes
+
+
+def test_unset_fields_are_left_out():
+    assert TaskUpdate(status="completed").model_dump(exclude_unset=True) == {
+        "status": "completed"
+    }
+
+
+@pytest.mark.parametrize(
+    "field", ["title", "priority", "category", "status", "assigned_to"]
+)
+def test_required_fields_cannot_be_cleared(field):
+    with pytest.raises(HTTPException) as e:
+        _validate_changes({field: None})
+    assert e.value.status_code == 422
+
+
+def test_optional_fields_can_be_cleared():
+    assert _validate_changes({"description": None, "due_date": None}) == {
+        "description": None, "due_date": None
+    }
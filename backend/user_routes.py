@@ -1,8 +1,14 @@
-from fastapi import APIRouter, HTTPException,Depends
+from fastapi import APIRouter, HTTPException,Depends, Header
 from pydantic import BaseModel
-from auth_utils import hash_password, verify_password, create_access_token
-from json_db import load_db, save_db
+from auth_utils import (
+    hash_password_async, verify_password_async,
+    create_access_token, PasswordPoolBusy
+)
+from storage import db
 from role_utils import get_payload,admin_required
+from responses import (
+    FastJSONResponse, project, list_etag, etag_matches, cache_headers, not_modified
+)
 
 
 from fastapi import Depends
@@ -15,42 +21,66 @@ class SignupIn(BaseModel):
     password: str
     role: str = "user"   # default role (user)
 
+class UserOut(BaseModel):
+    id: int
+    name: str | None = None
+    email: str
+    role: str
+
 class LoginIn(BaseModel):
 
     email: str
     password: str
 
 
+def too_busy():
+    return HTTPException(
+        status_code=429,
+        detail="Too many sign-in requests, try again shortly",
+        headers={"Retry-After": "1"}
+    )
+
+
 @router.post("/signup")
-def signup(user: SignupIn):
-    db = load_db()
-
-    # check if email exists
-    if any(u["email"] == user.email for u in db["users"]):
-        raise HTTPException(status_code=400, detail="User already exists")
-
-    new_user = {
-        "id": len(db["users"]) + 1,
-        "name": user.name,
-        "email": user.email,
-        "password": hash_password(user.password),
-        "role": user.role.lower()   # "admin" or "user"
-    }
+async def signup(user: SignupIn):
+    try:
+        password = await hash_password_async(user.password)
+    except PasswordPoolBusy:
+        raise too_busy()
 
-    db["users"].append(new_user)
-    save_db(db)
+    new_user = await db.awrite(_insert_user, user, password)
 
     return {"message": "User created", "role": new_user["role"]}
 
 
-@router.post("/login")
-def login(user: LoginIn):
-    db = load_db()
+def _insert_user(user: SignupIn, password: str) -> dict:
+    with db.transaction():
+        # check if email exists
+        if db.find("users", email=user.email):
+            raise HTTPException(status_code=400, detail="User already exists")
 
+        return db.insert("users", {
+            "name": user.name,
+            "email": user.email,
+            "password": password,
+            "role": user.role.lower()   # "admin" or "user"
+        })
+
+
+@router.post("/login")
+async def login(user: LoginIn):
     # find user
-    db_user = next((u for u in db["users"] if u["email"] == user.email), None)
+    matches = await db.aread(db.find, "users", email=user.email)
+    db_user = next(iter(matches), None)
 
-    if not db_user or not verify_password(user.password, db_user["password"]):
+    try:
+        valid = db_user is not None and await verify_password_async(
+            user.password, db_user["password"]
+        )
+    except PasswordPoolBusy:
+        raise too_busy()
+
+    if not valid:
         raise HTTPException(status_code=400, detail="Invalid email or password")
 
     # create JWT token storing role + id
@@ -65,18 +95,25 @@ def login(user: LoginIn):
     }
 
 @router.get("/me")
-def get_me(payload: dict = Depends(get_payload)):
+async def get_me(payload: dict = Depends(get_payload)):
     return {
         "user_id": payload["user_id"],
         "role": payload["role"]
     }
 
-@router.get("/users")
-def list_users(payload: dict = Depends(get_payload)):
+@router.get("/users", response_model=list[UserOut])
+async def list_users(
+    if_none_match: str | None = Header(None),
+    payload: dict = Depends(get_payload)
+):
     # Only admin can get all users
     if payload["role"] != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
 
-    db = load_db()
-    return db["users"]
+    tag = list_etag(payload["user_id"], payload["role"], await db.aread(db.version, "users"))
+    if etag_matches(if_none_match, tag):
+        return not_modified(tag)
+
+    users = await db.aread(db.all, "users")
+    return FastJSONResponse(project(users, UserOut), headers=cache_headers(tag))
 
@@ -1,11 +1,11 @@
 from datetime import datetime, date
 
-def calculate_priority(due_date_str: str | None):
+def calculate_priority(due_date_str: str | None, today: date | None = None):
     if not due_date_str:
         return None
 
     due_date = datetime.strptime(due_date_str, "%Y-%m-%d").date()
-    today = date.today()
+    today = today or date.today()
     diff = (due_date - today).days
 
     if diff <= 0:
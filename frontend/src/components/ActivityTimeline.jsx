@@ -3,6 +3,7 @@ import API from "../api";
 
 export default function ActivityTimeline({ taskId, onClose }) {
   const [logs, setLogs] = useState([]);
+  const [nextBefore, setNextBefore] = useState(null);
 
   const token = localStorage.getItem("token");
   const authHeader = { headers: { Authorization: `Bearer ${token}` } };
@@ -12,10 +13,12 @@ export default function ActivityTimeline({ taskId, onClose }) {
     // eslint-disable-next-line
   }, []);
 
-  const loadLogs = async () => {
+  const loadLogs = async (before = null) => {
     try {
-      const res = await API.get(`/activity/${taskId}`, authHeader);
-      setLogs(res.data);
+      const query = before ? `?before=${before}` : "";
+      const res = await API.get(`/activity/${taskId}${query}`, authHeader);
+      setLogs((prev) => (before ? [...res.data.logs, ...prev] : res.data.logs));
+      setNextBefore(res.data.next_before);
     } catch (err) {
       console.error("Failed to load activity logs", err);
     }
@@ -32,9 +35,19 @@ export default function ActivityTimeline({ taskId, onClose }) {
         <div className="text-gray-500 text-sm">No activity yet</div>
       ) : (
         <ul className="space-y-3 text-sm">
-          {logs.map((log, index) => (
-            <li key={index} className="border-l-2 pl-3 border-blue-400">
-              <div>{log.action}</div>
+          {nextBefore && (
+            <li>
+              <button
+                onClick={() => loadLogs(nextBefore)}
+                className="text-xs text-blue-600 underline"
+              >
+                Load older activity
+              </button>
+            </li>
+          )}
+          {logs.map((log) => (
+            <li key={log.id} className="border-l-2 pl-3 border-blue-400">
+              <div>{log.message}</div>
               <div className="text-xs text-gray-500">
                 {new Date(log.timestamp).toLocaleString()}
               </div>
@@ -11,21 +11,43 @@ export default function GroupChat() {
   const [text, setText] = useState("");
   const [me, setMe] = useState(null);
   const [socketReady, setSocketReady] = useState(false);
+  const [hasOlder, setHasOlder] = useState(false);
 
   const bottomRef = useRef(null);
   const fileInputRef = useRef(null);
 
   const token = localStorage.getItem("token");
   const authHeader = { headers: { Authorization: `Bearer ${token}` } };
+  const PAGE_SIZE = 50;
 
   // ================= LOAD USER & HISTORY =================
   useEffect(() => {
     API.get("/auth/me", authHeader).then(res => setMe(res.data));
-    API.get(`/chat/${groupId}`, authHeader).then(res =>
-      setMessages(res.data || [])
-    );
+    API.get(`/chat/${groupId}`, {
+      ...authHeader,
+      params: { limit: PAGE_SIZE }
+    }).then(res => {
+      const page = res.data || [];
+      setMessages(page);
+      setHasOlder(page.length === PAGE_SIZE);
+    });
   }, [groupId]);
 
+  // ================= LOAD OLDER HISTORY =================
+  const loadOlder = async () => {
+    const oldest = messages.find(m => m.id);
+    if (!oldest) return;
+
+    const res = await API.get(`/chat/${groupId}`, {
+      ...authHeader,
+      params: { before: oldest.id, limit: PAGE_SIZE }
+    });
+
+    const page = res.data || [];
+    setMessages(prev => [...page, ...prev]);
+    setHasOlder(page.length === PAGE_SIZE);
+  };
+
   // ================= WEBSOCKET =================
   useEffect(() => {
     connectChatSocket(
@@ -115,6 +137,17 @@ export default function GroupChat() {
 
         {/* ================= MESSAGES ================= */}
         <div className="flex-1 bg-[#F6EEE4] rounded-xl p-4 overflow-y-auto mb-4">
+          {hasOlder && (
+            <div className="text-center mb-4">
+              <button
+                onClick={loadOlder}
+                className="text-xs text-[#561C24] underline"
+              >
+                Load earlier messages
+              </button>
+            </div>
+          )}
+
           {messages.map((m, i) => {
             const isMe = me && m.sender_id === me.user_id;
 
@@ -1,9 +1,10 @@
-import { useEffect, useState } from "react";
+import { useEffect, useRef, useState } from "react";
 import API from "../api";
 import TaskForm from "../components/TaskForm";
 import TaskCard from "../components/TaskCard";
 import ActivityTimeline from "../components/ActivityTimeline";
 import Navbar from "../components/Navbar";
+import { connectEventSocket } from "../wsClient";
 
 
 export default function Dashboard() {
@@ -15,6 +16,7 @@ export default function Dashboard() {
   const [editing, setEditing] = useState(null);
   const [loading, setLoading] = useState(false);
   const [showActivity, setShowActivity] = useState(null);
+  const taskRev = useRef(0);
 
   const token = localStorage.getItem("token");
   const authHeader = { headers: { Authorization: `Bearer ${token}` } };
@@ -37,11 +39,30 @@ export default function Dashboard() {
     } catch {}
   };
 
+  // Merge what changed since the last revision we saw
+  const applyChanges = ({ rev, reset, upserts, deleted }) => {
+    taskRev.current = rev;
+    setTasks((prev) => {
+      const byId = new Map(reset ? [] : prev.map((t) => [t.id, t]));
+      deleted.forEach((id) => byId.delete(id));
+      upserts.forEach((t) => byId.set(t.id, t));
+      return [...byId.values()].sort((a, b) => a.id - b.id);
+    });
+  };
+
+  const syncTasks = async () => {
+    try {
+      const res = await API.get(`/tasks/changes?since=${taskRev.current}`, authHeader);
+      applyChanges(res.data);
+    } catch {}
+  };
+
   const loadTasks = async () => {
     setLoading(true);
+    taskRev.current = 0;
     try {
-      const res = await API.get("/tasks", authHeader);
-      setTasks(res.data);
+      const res = await API.get("/tasks/changes?since=0", authHeader);
+      applyChanges(res.data);
     } catch {
       setTasks([]);
     } finally {
@@ -52,13 +73,19 @@ export default function Dashboard() {
   useEffect(() => {
     loadUser();
     loadTasks();
+
+    // Pushed changes replace polling: fetch just the delta
+    return connectEventSocket(token, (event) => {
+      if (event.type === "reset") loadTasks();
+      else if (event.type === "ready" || event.type.startsWith("task.")) syncTasks();
+    });
   }, []);
 
   const createTask = async (payload) => {
     try {
       await API.post("/tasks", payload, authHeader);
       setShowCreate(false);
-      loadTasks();
+      syncTasks();
     } catch {
       alert("Create failed");
     }
@@ -67,11 +94,21 @@ export default function Dashboard() {
   const startEdit = (task) => setEditing(task);
 
   const saveEdit = async (payload) => {
+    // Only overwrite the version we edited
+    const headers = { ...authHeader.headers };
+    if (editing.rev) headers["If-Match"] = `"${editing.rev}"`;
+
     try {
-      await API.put(`/tasks/${editing.id}`, payload, authHeader);
+      await API.put(`/tasks/${editing.id}`, payload, { headers });
       setEditing(null);
-      loadTasks();
-    } catch {
+      syncTasks();
+    } catch (err) {
+      if (err.response?.status === 412) {
+        alert("This task was changed by someone else. Reloaded the latest version.");
+        setEditing(null);
+        syncTasks();
+        return;
+      }
       alert("Update failed");
     }
   };
@@ -80,7 +117,7 @@ export default function Dashboard() {
     if (!window.confirm("Delete this task?")) return;
     try {
       await API.delete(`/tasks/${task.id}`, authHeader);
-      loadTasks();
+      syncTasks();
     } catch {
       alert("Delete failed");
     }
@@ -94,7 +131,7 @@ export default function Dashboard() {
 
     try {
       await API.put(`/tasks/${task.id}`, { status: newStatus }, authHeader);
-      loadTasks();
+      syncTasks();
     } catch {}
   };
 
@@ -1,9 +1,12 @@
 import { useEffect, useState } from "react";
 import API from "../api";
 import Navbar from "../components/Navbar";
+import { connectEventSocket } from "../wsClient";
 
 export default function Notifications() {
   const [notifications, setNotifications] = useState([]);
+  const [inbox, setInbox] = useState([]);
+  const [unread, setUnread] = useState(0);
   const [loading, setLoading] = useState(false);
 
   const token = localStorage.getItem("token");
@@ -11,8 +14,38 @@ export default function Notifications() {
 
   useEffect(() => {
     loadNotifications();
+    loadInbox();
+
+    return connectEventSocket(token, (event) => {
+      if (event.type === "notification.created" || event.type === "reset") {
+        loadInbox();
+      }
+      if (event.type.startsWith("task.") || event.type === "reset") {
+        loadNotifications();
+      }
+    });
   }, []);
 
+  const loadInbox = async () => {
+    try {
+      const res = await API.get("/notifications/inbox", authHeader);
+      setInbox(res.data.notifications);
+      setUnread(res.data.unread_count);
+    } catch {
+      setInbox([]);
+    }
+  };
+
+  const markRead = async (id) => {
+    await API.post(`/notifications/${id}/read`, {}, authHeader);
+    loadInbox();
+  };
+
+  const markAllRead = async () => {
+    await API.post("/notifications/read-all", {}, authHeader);
+    loadInbox();
+  };
+
   const loadNotifications = async () => {
     setLoading(true);
     try {
@@ -41,6 +74,39 @@ export default function Notifications() {
           Notifications
         </h1>
 
+        {/* INBOX */}
+        {inbox.length > 0 && (
+          <div className="bg-[#F6EEE4] rounded-xl p-4 shadow mb-6">
+            <div className="flex justify-between items-center mb-3">
+              <h2 className="font-semibold text-[#561C24]">
+                Inbox {unread > 0 && `(${unread} unread)`}
+              </h2>
+              {unread > 0 && (
+                <button
+                  onClick={markAllRead}
+                  className="text-xs text-[#561C24] underline"
+                >
+                  Mark all as read
+                </button>
+              )}
+            </div>
+
+            <div className="space-y-2">
+              {inbox.map(n => (
+                <div
+                  key={n.id}
+                  onClick={() => !n.read && markRead(n.id)}
+                  className={`text-sm p-2 rounded-lg cursor-pointer ${
+                    n.read ? "text-gray-500" : "bg-white text-[#3B0D14] font-medium"
+                  }`}
+                >
+                  {n.message}
+                </div>
+              ))}
+            </div>
+          </div>
+        )}
+
         {loading ? (
           <div className="text-[#561C24]">Loading…</div>
         ) : notifications.length === 0 ? (
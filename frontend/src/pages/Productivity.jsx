@@ -3,40 +3,44 @@ import API from "../api";
 import Navbar from "../components/Navbar";
 
 export default function Productivity() {
-  const [tasks, setTasks] = useState([]);
+  const [stats, setStats] = useState(null);
   const [loading, setLoading] = useState(false);
 
   const token = localStorage.getItem("token");
   const authHeader = { headers: { Authorization: `Bearer ${token}` } };
 
   useEffect(() => {
-    loadTasks();
+    loadStats();
   }, []);
 
-  const loadTasks = async () => {
+  // Counts are aggregated on the server; no need to download every task
+  const loadStats = async () => {
     setLoading(true);
     try {
-      const res = await API.get("/tasks", authHeader);
-      setTasks(res.data);
+      const res = await API.get("/tasks/stats", authHeader);
+      setStats(res.data);
     } catch {
-      setTasks([]);
+      setStats(null);
     } finally {
       setLoading(false);
     }
   };
 
-  const total = tasks.length;
-  const completed = tasks.filter(t => t.status === "completed").length;
-  const inprogress = tasks.filter(t => t.status === "in_progress").length;
-  const pending = tasks.filter(t => t.status === "pending").length;
+  const byStatus = stats?.by_status || {};
+  const byPriority = stats?.by_priority || {};
+
+  const total = stats?.total || 0;
+  const completed = byStatus.completed || 0;
+  const inprogress = byStatus.in_progress || 0;
+  const pending = byStatus.pending || 0;
 
   const completionRate = total
     ? Math.round((completed / total) * 100)
     : 0;
 
-  const high = tasks.filter(t => t.priority === "high").length;
-  const medium = tasks.filter(t => t.priority === "medium").length;
-  const low = tasks.filter(t => t.priority === "low").length;
+  const high = byPriority.high || 0;
+  const medium = byPriority.medium || 0;
+  const low = byPriority.low || 0;
 
   return (
     <div className="min-h-screen bg-[#E8D8C4]">
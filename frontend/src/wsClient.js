@@ -33,3 +33,36 @@ export function sendChatMessage(message) {
     socket.send(JSON.stringify(message));
   }
 }
+
+// Task / notification events for the logged-in user. Reconnects on its
+// own and resumes from the last event seen; a "reset" event means some
+// were missed and the caller should reload.
+export function connectEventSocket(token, onEvent) {
+  let lastEventId = null;
+  let closed = false;
+  let retry = null;
+  let events = null;
+
+  const open = () => {
+    const resume = lastEventId ? `&last_event_id=${lastEventId}` : "";
+    events = new WebSocket(`ws://localhost:8000/events/ws?token=${token}${resume}`);
+
+    events.onmessage = (event) => {
+      const data = JSON.parse(event.data);
+      if (data.id) lastEventId = data.id;
+      onEvent(data);
+    };
+
+    events.onclose = () => {
+      if (!closed) retry = setTimeout(open, 2000);
+    };
+  };
+
+  open();
+
+  return () => {
+    closed = true;
+    clearTimeout(retry);
+    events && events.close();
+  };
+}